@@ -1,38 +1,57 @@
 import streamlit as st
 import pandas as pd
-from pathlib import Path
 from PIL import Image
+import data_store
+import change_feed
+import kafla_directory
+import locking
+import seasons
+import reconcile
+from schema import fmt_date
 
 # Page Config
 #st.set_page_config(page_title="🛠️ Admin Panel | ایڈمن پینل", layout="wide")
 st.title("🛠️ Zaireen Admin Panel | زائرین کا ایڈمن پینل")
 
 # Load data
-base_path = Path("docs")
-kafla_file = Path("kafla.csv")
-zaireen_file = base_path / "zaireen.csv"
+base_path = data_store.BASE_DIR
 
-if not kafla_file.exists() or not zaireen_file.exists():
+if not data_store.KAFLA_CSV.exists() or not data_store.ZAIREEN_CSV.exists():
     st.warning("⚠️ Required data not found. Make sure Kafla and Zaireen data is available.")
     st.stop()
 
-kafla_df = pd.read_csv(kafla_file)
-zaireen_df = pd.read_csv(zaireen_file)
+# Shared read-only frame; edits go through data_store and the change feed
+zaireen_df = data_store.load_zaireen()
 
-# Ensure required columns
-if "Contact" not in kafla_df.columns:
-    kafla_df["Contact"] = ""
+new_changes = change_feed.subscribe("admin")
+if new_changes:
+    st.info(f"🔔 {len(new_changes)} change(s) since your last view have been applied.")
 
-if "Contact" not in zaireen_df.columns:
-    zaireen_df["Contact"] = ""
+selected_kafla_code = kafla_directory.select_kafla("Select Kafla | قافلہ منتخب کریں", "admin_kafla", with_code=True)
+if selected_kafla_code is None:
+    st.stop()
+kafla_info = kafla_directory.directory().get(selected_kafla_code)
+
+KAFLA_EDIT_FIELDS = {'Kafla Name': "edit_kafla_name", 'Salar Name': "edit_salar_name", 'City': "edit_city",
+                     'Province': "edit_province", 'Contact': "edit_contact", 'Departure Date': "edit_departure"}
+ZAIREEN_EDIT_FIELDS = {'Zaireen Name': "name", 'Contact': "contact", 'Nationality': "nationality"}
+
+
+# Remember the values an edit started from, so saving can detect that another
+# volunteer (or replica) changed the record in the meantime
+def edit_baseline(state_key, record, fields):
+    if state_key not in st.session_state:
+        st.session_state[state_key] = {col: record.get(col) for col in fields}
+    return st.session_state[state_key]
 
-# Generate dropdown label
-kafla_df['Label'] = kafla_df.apply(lambda row: f"{row['Kafla Name']} ({row['Salar Name']}) - {row['Kafla Code']}", axis=1)
-kafla_map = dict(zip(kafla_df['Label'], kafla_df['Kafla Code']))
 
-selected_label = st.selectbox("🔍 Select Kafla | قافلہ منتخب کریں", list(kafla_map.keys()))
-selected_kafla_code = kafla_map[selected_label]
-kafla_info = kafla_df[kafla_df['Kafla Code'] == selected_kafla_code].iloc[0]
+def reset_edit(state_key, widget_keys):
+    st.session_state.pop(state_key, None)
+    for key in widget_keys:
+        st.session_state.pop(key, None)
+
+
+kafla_baseline = edit_baseline(f"orig_kafla_{selected_kafla_code}", kafla_info, KAFLA_EDIT_FIELDS)
 
 st.markdown("### 🏷️ Kafla Information | قافلہ کی معلومات")
 
@@ -41,15 +60,25 @@ salar_name = st.text_input("Salar Name", kafla_info['Salar Name'], key="edit_sal
 city = st.text_input("City", kafla_info['City'], key="edit_city")
 province = st.text_input("Province", kafla_info['Province'], key="edit_province")
 contact_value = st.text_input("Contact", kafla_info.get('Contact', ''), key="edit_contact")
+departure = st.text_input("Departure Date (YYYY-MM-DD)", fmt_date(kafla_info['Departure Date']), key="edit_departure")
 
 if st.button("💾 Save Kafla Info"):
-    kafla_df.loc[kafla_df['Kafla Code'] == selected_kafla_code, 'Kafla Name'] = kafla_name
-    kafla_df.loc[kafla_df['Kafla Code'] == selected_kafla_code, 'Salar Name'] = salar_name
-    kafla_df.loc[kafla_df['Kafla Code'] == selected_kafla_code, 'City'] = city
-    kafla_df.loc[kafla_df['Kafla Code'] == selected_kafla_code, 'Province'] = province
-    kafla_df.loc[kafla_df['Kafla Code'] == selected_kafla_code, 'Contact'] = contact_value
-    kafla_df.to_csv(kafla_file, index=False)
-    st.success("✅ Kafla info updated successfully!")
+    try:
+        data_store.update_kafla(selected_kafla_code, {
+            'Kafla Name': kafla_name,
+            'Salar Name': salar_name,
+            'City': city,
+            'Province': province,
+            'Contact': contact_value,
+            'Departure Date': departure,
+            # The season follows the departure year
+            'Season': departure[:4] if departure[:4].isdigit() else kafla_info['Season'],
+        }, expected=kafla_baseline)
+        st.toast("✅ Kafla info updated successfully!")
+    except data_store.ConflictError as e:
+        st.toast(f"⚠️ Not saved: {e} Showing the latest values.")
+    reset_edit(f"orig_kafla_{selected_kafla_code}", KAFLA_EDIT_FIELDS.values())
+    st.rerun()
 
 # Filter Zaireen of selected Kafla
 filtered_df = zaireen_df[zaireen_df['Kafla Code'] == selected_kafla_code].reset_index(drop=True)
@@ -63,15 +92,19 @@ else:
     for i, row in filtered_df.iterrows():
         st.markdown("---")
         cols = st.columns([2, 2, 2, 2, 1, 1])
-        full_name = cols[0].text_input("Full Name", row['Zaireen Name'], key=f"name_{i}")
-        passport = cols[1].text_input("Passport Number", row['Passport Number'], key=f"passport_{i}", disabled=True)
-        contact = cols[2].text_input("Contact", row.get('Contact', ''), key=f"contact_{i}")
-        nationality = cols[3].text_input("Nationality", row['Nationality'], key=f"nationality_{i}")
+        pnum = row['Passport Number']
+        # Passport numbers are only unique within a Kafla
+        row_key = f"{selected_kafla_code}_{pnum}"
+        baseline = edit_baseline(f"orig_zaireen_{row_key}", row, ZAIREEN_EDIT_FIELDS)
+        full_name = cols[0].text_input("Full Name", row['Zaireen Name'], key=f"name_{row_key}")
+        passport = cols[1].text_input("Passport Number", row['Passport Number'], key=f"passport_{row_key}", disabled=True)
+        contact = cols[2].text_input("Contact", row.get('Contact', ''), key=f"contact_{row_key}")
+        nationality = cols[3].text_input("Nationality", row['Nationality'], key=f"nationality_{row_key}")
 
         # Show attachments
         docs_path = base_path / selected_kafla_code / "zaireen" / passport
         doc_cols = st.columns(3)
-        for idx, doc_type in ['passport', 'iran', 'iraq']:
+        for idx, doc_type in enumerate(['passport', 'iran', 'iraq']):
             file = docs_path / f"{doc_type}.jpg"
             if file.exists():
                 doc_cols[idx].image(Image.open(file), caption=file.name, width=100)
@@ -79,30 +112,72 @@ else:
                 doc_cols[idx].markdown(f"*{doc_type.title()} Visa: ❌ Not Found*")
 
         col_action = st.columns([1, 1])
-        if col_action[0].button("💾 Save", key=f"save_{i}"):
-            zaireen_df.loc[(zaireen_df['Passport Number'] == passport), 'Zaireen Name'] = full_name
-            zaireen_df.loc[(zaireen_df['Passport Number'] == passport), 'Contact'] = contact
-            zaireen_df.loc[(zaireen_df['Passport Number'] == passport), 'Nationality'] = nationality
-            zaireen_df.to_csv(zaireen_file, index=False)
-            st.success(f"✅ Updated: {full_name}")
-            st.session_state["_refresh"] = True
-
-        if col_action[1].button("🗑️ Delete", key=f"delete_{i}"):
-            zaireen_df = zaireen_df[zaireen_df['Passport Number'] != passport]
-            zaireen_df.to_csv(zaireen_file, index=False)
-            # Optional: also remove the folder
-            folder = docs_path
-            if folder.exists():
-                import shutil
-                shutil.rmtree(folder, ignore_errors=True)
-            st.warning(f"❌ Deleted: {full_name}")
-            st.session_state["_refresh"] = True
-
-# Optional refresh workaround
-if st.session_state.get("_refresh"):
-    st.session_state.pop("_refresh")
-    st.experimental_set_query_params(refreshed=1)
-    st.experimental_rerun()
+        widget_keys = [f"{prefix}_{row_key}" for prefix in ZAIREEN_EDIT_FIELDS.values()]
+        if col_action[0].button("💾 Save", key=f"save_{row_key}"):
+            try:
+                data_store.update_zaireen(selected_kafla_code, passport, {
+                    'Zaireen Name': full_name,
+                    'Contact': contact,
+                    'Nationality': nationality,
+                }, expected=baseline)
+                st.toast(f"✅ Updated: {full_name}")
+            except data_store.ConflictError as e:
+                st.toast(f"⚠️ Not saved: {e} Showing the latest values.")
+            reset_edit(f"orig_zaireen_{row_key}", widget_keys)
+            st.rerun()
+
+        if col_action[1].button("🗑️ Delete", key=f"delete_{row_key}"):
+            try:
+                data_store.delete_zaireen(selected_kafla_code, passport, expected=baseline)
+                # Optional: also remove the folder
+                locking.remove_tree(docs_path)
+                st.toast(f"❌ Deleted: {full_name}")
+            except data_store.ConflictError as e:
+                st.toast(f"⚠️ Not deleted: {e} Showing the latest values.")
+            reset_edit(f"orig_zaireen_{row_key}", widget_keys)
+            st.rerun()
+
+# Seasons: move finished seasons out of the live data
+st.markdown("---")
+with st.expander("🗄️ Seasons | سیزن"):
+    season_counts = pd.Series(seasons.kafla_seasons()).value_counts()
+    for season in seasons.active_seasons():
+        cols = st.columns([4, 1])
+        cols[0].markdown(f"**{season}** (active): {season_counts[season]} Kafla(s)")
+        if seasons.is_past(season) and cols[1].button("🗄️ Archive", key=f"archive_{season}"):
+            try:
+                with st.spinner(f"Archiving {season}..."):
+                    moved = seasons.archive_season(season)
+                st.toast(f"✅ {len(moved)} Kafla(s) of {season} archived.")
+            except data_store.ConflictError as e:
+                st.toast(f"⚠️ Not archived: {e} Please try again.")
+            st.rerun()
+    for season in seasons.archived_seasons():
+        st.markdown(f"**{season}** (archived): `{seasons.archive_path(season)}`")
+
+# Documents: files in old layouts or left behind by deleted records
+with st.expander("🧹 Document Tree | دستاویزات"):
+    if st.button("🔍 Scan Documents"):
+        files, stats = reconcile.scan()
+        st.session_state["doc_report"] = reconcile.build_report(files)
+        st.caption(f"{len(files):,} file(s) in {stats['dirs']:,} folder(s); {stats['listed']:,} changed folder(s) listed.")
+    doc_report = st.session_state.get("doc_report")
+    if doc_report is not None:
+        st.write(doc_report["Status"].value_counts().to_dict())
+        st.dataframe(doc_report[doc_report["Status"] != "ok"], use_container_width=True, hide_index=True)
+        cols = st.columns(2)
+        if cols[0].button("📦 Move to Standard Layout"):
+            moved = reconcile.migrate(doc_report)
+            st.session_state.pop("doc_report")
+            st.toast(f"✅ {moved} file(s) moved.")
+            st.rerun()
+        if cols[1].button(f"🗑️ Remove Orphans (older than {reconcile.GC_GRACE // 3600}h)"):
+            removed, freed = reconcile.collect_garbage(doc_report)
+            st.session_state.pop("doc_report")
+            st.toast(f"🗑️ {removed} file(s) removed, {freed / 1e6:.1f} MB freed.")
+            st.rerun()
 
 st.markdown("---")
 st.markdown("Made with ❤️ for Moakab e Zainabiya")
+
+change_feed.auto_refresh("admin")
@@ -0,0 +1,299 @@
+"""Incremental, content-addressed backups with point-in-time restore.
+
+A backup target is a plain folder (a mounted disk, a synced share...)::
+
+    <dest>/blobs/ab/ab12...        file contents, named by their SHA-256
+    <dest>/manifests/<time>.json   what the tree looked like at each backup
+
+Only blobs the target does not have yet are copied, and files whose size
+and mtime match the previous manifest are not even re-read, so a nightly
+run over a multi-GB ``docs/`` tree only pays for what changed that day.
+Journal files (``*.jsonl``) are append-only and are shipped as a chain of
+tail chunks rather than whole files.
+
+Restore rebuilds ``kafla.csv`` and ``docs/zaireen.csv`` from the newest
+snapshot before the requested time plus the journal entries up to it::
+
+    python backup.py run /mnt/backup
+    python backup.py list /mnt/backup
+    python backup.py restore /mnt/backup restored/ --at "2025-08-14 18:00"
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import change_feed
+import data_store
+import locking
+import schema
+import seasons
+
+# Everything a backup covers, relative to the app root
+ROOTS = [data_store.KAFLA_CSV, data_store.BASE_DIR, seasons.ARCHIVE_DIR]
+# Snapshots plus the journal: what the tables are rebuilt from
+JOURNAL_ROOTS = [data_store.SNAPSHOT_DIR, change_feed.SEGMENT_DIR, change_feed.FEED_FILE]
+CHUNK_SIZE = 1 << 20
+
+
+def _skip_dir(name):
+    return name == locking.LOCK_DIR.name or ".deleted-" in name
+
+
+def _skip_file(name):
+    return name.startswith(".") and name.endswith(".tmp")
+
+
+def _walk(roots=ROOTS):
+    for root in roots:
+        root = Path(root)
+        if root.is_file():
+            yield root
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = sorted(d for d in dirnames if not _skip_dir(d))
+            for name in sorted(filenames):
+                if not _skip_file(name):
+                    yield Path(dirpath) / name
+
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class BlobStore:
+    """Content-addressed file store under ``<dest>/blobs``."""
+
+    def __init__(self, dest):
+        self.root = Path(dest) / "blobs"
+        self.added = 0
+        self.added_bytes = 0
+
+    def path(self, digest):
+        return self.root / digest[:2] / digest
+
+    def put_file(self, path, start=0, end=None):
+        """Store ``path[start:end]`` and return its digest; reads it once."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        sha = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as dst:
+                src.seek(start)
+                remaining = None if end is None else end - start
+                while remaining is None or remaining > 0:
+                    chunk = src.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    sha.update(chunk)
+                    dst.write(chunk)
+                    if remaining is not None:
+                        remaining -= len(chunk)
+            digest = sha.hexdigest()
+            target = self.path(digest)
+            if target.exists():
+                os.remove(tmp)
+            else:
+                target.parent.mkdir(exist_ok=True)
+                self.added += 1
+                self.added_bytes += os.path.getsize(tmp)
+                os.replace(tmp, target)
+            return digest
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+
+    def open(self, digest):
+        return open(self.path(digest), "rb")
+
+
+# ---------------- Backup ----------------
+
+def manifests(dest):
+    """``[(created, path)]`` of every backup in ``dest``, oldest first."""
+    found = []
+    for path in (Path(dest) / "manifests").glob("*.json"):
+        with open(path) as f:
+            found.append((json.load(f)["created"], path))
+    return sorted(found)
+
+
+def _load_manifest(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _backup_log(store, path, stat, previous):
+    # Append-only: ship only the complete lines added since last time
+    with open(path, "rb") as f:
+        first = f.readline()
+    head = _hash(first)
+    with open(path, "rb") as f:
+        f.seek(max(stat.st_size - CHUNK_SIZE, 0))
+        tail = f.read(min(stat.st_size, CHUNK_SIZE))
+    size = stat.st_size - (len(tail) - (tail.rfind(b"\n") + 1))
+    if previous and previous.get("head") == head and previous["size"] <= size:
+        chunks = list(previous["chunks"])
+        start = previous["size"]
+    else:
+        chunks, start = [], 0
+    if size > start:
+        chunks.append(store.put_file(path, start, size))
+    return {"size": size, "mtime_ns": stat.st_mtime_ns, "head": head, "chunks": chunks}
+
+
+def run_backup(dest, roots=ROOTS):
+    """Back the data up into ``dest``; return the new manifest's path."""
+    store = BlobStore(dest)
+    history = manifests(dest)
+    previous = _load_manifest(history[-1][1])["files"] if history else {}
+
+    def backup_file(path):
+        rel = path.as_posix()
+        stat = path.stat()
+        before = previous.get(rel)
+        if path.suffix == ".jsonl":
+            files[rel] = _backup_log(store, path, stat, before)
+        elif before and "sha256" in before and (before["size"], before["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+            files[rel] = before
+        else:
+            files[rel] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+                          "sha256": store.put_file(path)}
+
+    files = {}
+    # Snapshots and journal segments are captured together, so a compaction
+    # cannot move entries between them mid-backup
+    with locking.file_lock("data"):
+        seq = change_feed.latest_seq()
+        for path in _walk(JOURNAL_ROOTS):
+            backup_file(path)
+    for path in _walk(roots):
+        if path.as_posix() not in files:
+            backup_file(path)
+
+    created = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    manifest = {
+        "created": created, "seq": seq, "files": files,
+        "shipped": {"blobs": store.added, "bytes": store.added_bytes},
+    }
+    name = datetime.now().strftime("%Y%m%d-%H%M%S-%f") + ".json"
+    locking.atomic_write_bytes(Path(dest) / "manifests" / name, json.dumps(manifest, indent=1).encode("utf-8"))
+    return Path(dest) / "manifests" / name
+
+
+# ---------------- Restore ----------------
+
+def _is_journal(rel):
+    return any(rel == root.as_posix() or rel.startswith(root.as_posix() + "/") for root in JOURNAL_ROOTS)
+
+
+def _materialise(store, files, target):
+    for rel, info in files.items():
+        path = Path(target) / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "wb") as dst:
+            for digest in info.get("chunks", [info.get("sha256")]):
+                with store.open(digest) as src:
+                    shutil.copyfileobj(src, dst, CHUNK_SIZE)
+        os.utime(path, ns=(info["mtime_ns"], info["mtime_ns"]))
+
+
+def _rebuild_tables(target, at):
+    """Replay the restored journal onto the newest snapshot taken before ``at``."""
+    docs = Path(target) / data_store.BASE_DIR
+    taken = [s for s in data_store.snapshots(docs / data_store.SNAPSHOT_DIR.name) if s[1] <= at]
+    base_seq, base = (taken[-1][0], taken[-1][2]) if taken else (0, None)
+    entries = [e for e in change_feed.read_journal(base_seq, docs) if e["ts"] <= at]
+    if base is None and entries and entries[0]["seq"] != 1:
+        raise SystemExit(f"No snapshot from before {at} in this backup.")
+
+    paths = {"kafla": Path(target) / data_store.KAFLA_CSV, "zaireen": Path(target) / data_store.ZAIREEN_CSV}
+    for table, path in paths.items():
+        if base is not None:
+            df = schema.read_csv(base / f"{table}.csv", table)
+        else:
+            df = schema.coerce(pd.DataFrame(), table)
+        df = data_store._apply(df, table, [e for e in entries if e["table"] == table])
+        locking.atomic_write_csv(df, path)
+
+    # Cut the journal at the restored point so the app continues from there
+    last = entries[-1]["seq"] if entries else base_seq
+    for segment in (docs / change_feed.SEGMENT_DIR.name).glob("*.jsonl"):
+        if int(segment.stem) > base_seq:
+            segment.unlink()
+    for seq, _, folder in data_store.snapshots(docs / data_store.SNAPSHOT_DIR.name):
+        if seq > base_seq:
+            shutil.rmtree(folder)
+    marker = {"seq": base_seq, "ts": at, "op": "base"}
+    journal = b"".join(change_feed._line(e) for e in [marker] + entries)
+    locking.atomic_write_bytes(docs / change_feed.FEED_FILE.name, journal)
+    locking.atomic_write_bytes(docs / data_store.APPLIED_FILE.name,
+                               json.dumps({"kafla": last, "zaireen": last}).encode("utf-8"))
+    return last
+
+
+def restore(dest, target, at=None):
+    """Restore the backup in ``dest`` into the empty folder ``target``.
+
+    Records are restored to the exact moment ``at`` (default: the latest
+    backup) from the first backup whose journal covers it; documents come
+    from the last backup taken at or before it.
+    """
+    history = manifests(dest)
+    if not history:
+        raise SystemExit(f"No backups in {dest}.")
+    at = datetime.fromisoformat(at).strftime("%Y-%m-%d %H:%M:%S") if at else history[-1][0]
+    before = [path for created, path in history if created <= at]
+    later = [path for created, path in history if created >= at]
+    journal = _load_manifest(later[0] if later else history[-1][1])
+    documents = _load_manifest(before[-1]) if before else journal
+    if not later:
+        print(f"Latest backup is from {journal['created']}; restoring up to then.")
+
+    target = Path(target)
+    if target.exists() and any(target.iterdir()):
+        raise SystemExit(f"{target} is not empty.")
+    files = {rel: info for rel, info in documents["files"].items() if not _is_journal(rel)}
+    files.update((rel, info) for rel, info in journal["files"].items() if _is_journal(rel))
+    _materialise(BlobStore(dest), files, target)
+    seq = _rebuild_tables(target, at)
+    print(f"Restored to {at} (change #{seq}) into {target}: records from the backup of "
+          f"{journal['created']}, documents from {documents['created']}")
+    return seq
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Incremental backups of records and documents")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("run", help="back up into DEST")
+    p.add_argument("dest")
+    p.add_argument("--compact", action="store_true", help="take a snapshot first")
+    p = sub.add_parser("list", help="list the backups in DEST")
+    p.add_argument("dest")
+    p = sub.add_parser("restore", help="restore DEST into an empty TARGET folder")
+    p.add_argument("dest")
+    p.add_argument("target")
+    p.add_argument("--at", help="point in time, e.g. '2025-08-14 18:00' (default: latest)")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        if args.compact:
+            data_store.compact()
+        manifest = _load_manifest(run_backup(args.dest))
+        shipped = manifest["shipped"]
+        print(f"{len(manifest['files'])} file(s), {shipped['blobs']} new blob(s), "
+              f"{shipped['bytes'] / 1e6:.1f} MB shipped")
+    elif args.command == "list":
+        for created, path in manifests(args.dest):
+            manifest = _load_manifest(path)
+            print(f"{created}  change #{manifest['seq']}  {len(manifest['files'])} file(s)")
+    else:
+        restore(args.dest, args.target, args.at)
@@ -0,0 +1,615 @@
+"""Offline benchmarks and stress checks for the portal's data layer.
+
+Run from the app root, e.g.::
+
+    python benchmarks.py stress --replicas 8 --ops 200
+    python benchmarks.py quality --good samples/good --bad samples/bad
+    python benchmarks.py memory --rows 100000
+    python benchmarks.py validate --rows 100000
+    python benchmarks.py backup --rows 20000 --docs 2000
+    python benchmarks.py reconcile --rows 20000
+    python benchmarks.py dashboard --rows 1000 10000 100000
+    python benchmarks.py previews --kaflas 200
+    python benchmarks.py kaflas --kaflas 1000 10000 100000
+
+Each subcommand works in a throwaway directory and never touches real data.
+"""
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+
+# ---------------- stress: concurrent replicas ----------------
+
+def _stress_worker(workdir, worker, ops, increments):
+    os.chdir(workdir)
+    import data_store
+
+    kept = []
+    for i in range(ops):
+        passport = f"W{worker:02d}P{i:05d}"
+        data_store.insert_zaireen({
+            "Kafla Code": "STRESS",
+            "Zaireen Name": f"Worker {worker} #{i}",
+            "Passport Number": passport,
+        })
+        if i % 2:
+            data_store.delete_zaireen("STRESS", passport)
+        else:
+            kept.append(passport)
+
+    # Read-modify-write on one shared row; optimistic checks must force retries
+    conflicts = 0
+    for _ in range(increments):
+        while True:
+            row = data_store.load_kafla().set_index("Kafla Code").loc["STRESS"]
+            count = int(row["Contact"])
+            try:
+                data_store.update_kafla("STRESS", {"Contact": count + 1}, expected={"Contact": row["Contact"]})
+                break
+            except data_store.ConflictError:
+                conflicts += 1
+    return kept, conflicts
+
+
+def stress(args):
+    workdir = tempfile.mkdtemp(prefix="zaireen-stress-")
+    os.chdir(workdir)
+    import data_store
+    import change_feed
+
+    data_store.insert_kafla({"Kafla Code": "STRESS", "Kafla Name": "Stress", "Salar Name": "-", "Contact": 0})
+
+    start = time.perf_counter()
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(args.replicas) as pool:
+        results = pool.starmap(
+            _stress_worker,
+            [(workdir, w, args.ops, args.increments) for w in range(args.replicas)],
+        )
+    elapsed = time.perf_counter() - start
+
+    expected = {p for kept, _ in results for p in kept}
+    data_store._tables.clear()
+    zdf = data_store.load_zaireen()
+    found = set(zdf["Passport Number"].astype(str))
+    counter = int(data_store.load_kafla().set_index("Kafla Code").loc["STRESS", "Contact"])
+    total_increments = args.replicas * args.increments
+
+    change_feed._reset()
+    seqs = [e["seq"] for e in change_feed.changes_since(0) or []]
+    writes = 1 + args.replicas * (args.ops + args.ops // 2 + args.increments)
+
+    lost = expected - found
+    resurrected = found - expected
+    print(f"replicas={args.replicas} ops/replica={args.ops} elapsed={elapsed:.2f}s")
+    print(f"rows expected={len(expected)} found={len(found)} lost={len(lost)} resurrected={len(resurrected)}")
+    print(f"counter expected={total_increments} found={counter} "
+          f"conflicts retried={sum(c for _, c in results)}")
+    print(f"feed entries={len(seqs)} expected={writes} gapless={seqs == list(range(1, len(seqs) + 1))}")
+
+    ok = (not lost and not resurrected and counter == total_increments
+          and len(seqs) == writes and seqs == list(range(1, writes + 1)))
+    print("OK" if ok else "FAILED")
+    return 0 if ok else 1
+
+
+# ---------------- quality: pre-OCR gate vs. OCR time ----------------
+
+def _image_files(paths):
+    files = []
+    for path in paths:
+        path = Path(path)
+        if path.is_dir():
+            files += sorted(p for p in path.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        elif path.exists():
+            files.append(path)
+    return files
+
+
+def _synthetic_bad(good_files):
+    # Typical failed captures derived from the good samples
+    import cv2
+
+    for path in good_files:
+        image = cv2.imread(str(path))
+        h = image.shape[0]
+        yield f"{path.stem}-blur", cv2.GaussianBlur(image, (0, 0), 6)
+        yield f"{path.stem}-dark", cv2.convertScaleAbs(image, alpha=0.15, beta=0)
+        yield f"{path.stem}-glare", cv2.convertScaleAbs(image, alpha=1.0, beta=150)
+        yield f"{path.stem}-no-mrz", image[: int(h * 0.6)]
+        yield f"{path.stem}-upside-down", cv2.rotate(image, cv2.ROTATE_180)
+        yield f"{path.stem}-sideways", cv2.rotate(image, cv2.ROTATE_90_CLOCKWISE)
+
+
+def _timed_ocr(read_mrz, data, workdir):
+    path = Path(workdir) / "sample.jpg"
+    path.write_bytes(data)
+    start = time.perf_counter()
+    mrz = read_mrz(str(path))
+    return mrz is not None, time.perf_counter() - start
+
+
+def quality(args):
+    import cv2
+    from image_quality import check_frame
+
+    try:
+        from passporteye import read_mrz
+    except ImportError:
+        read_mrz = None
+        print("passporteye not installed: timing the gate only")
+
+    samples = [(p.name, "good", p.read_bytes()) for p in _image_files(args.good)]
+    if args.bad:
+        samples += [(p.name, "bad", p.read_bytes()) for p in _image_files(args.bad)]
+    else:
+        for name, image in _synthetic_bad(_image_files(args.good)):
+            samples.append((name, "bad", cv2.imencode(".jpg", image)[1].tobytes()))
+    if not samples:
+        print("No samples found")
+        return 1
+
+    workdir = tempfile.mkdtemp(prefix="zaireen-quality-")
+    gate_total = ocr_without = ocr_with = 0.0
+    rejected = 0
+    print(f"{'sample':32} {'set':5} {'gate':>8} {'verdict':10} {'ocr raw':>9} {'ocr gated':>9}")
+    for name, kind, data in samples:
+        start = time.perf_counter()
+        result = check_frame(data)
+        gate = time.perf_counter() - start
+        gate_total += gate
+        verdict = ("rotate%d" % result["rotation"]) if result["rotation"] else ("pass" if result["ok"] else "reject")
+        rejected += not result["ok"]
+        raw = gated = "-"
+        if read_mrz is not None:
+            try:
+                ok_raw, t_raw = _timed_ocr(read_mrz, data, workdir)
+            except Exception as e:
+                # e.g. passporteye installed without the tesseract binary
+                print(f"OCR unavailable ({type(e).__name__}): timing the gate only")
+                read_mrz = None
+                ocr_without = ocr_with = 0.0
+        if read_mrz is not None:
+            ocr_without += t_raw
+            raw = f"{'ok' if ok_raw else 'fail'} {t_raw:.2f}s"
+            if result["ok"]:
+                ok_gated, t_gated = _timed_ocr(read_mrz, result["data"], workdir)
+                ocr_with += t_gated
+                gated = f"{'ok' if ok_gated else 'fail'} {t_gated:.2f}s"
+        print(f"{name[:32]:32} {kind:5} {gate * 1000:6.1f}ms {verdict:10} {raw:>9} {gated:>9}")
+
+    print(f"gate: {len(samples)} samples, mean {gate_total / len(samples) * 1000:.1f} ms, "
+          f"{rejected} rejected before OCR")
+    if read_mrz is not None:
+        print(f"OCR time without gate {ocr_without:.2f}s, with gate {ocr_with + gate_total:.2f}s "
+              f"(saved {ocr_without - ocr_with - gate_total:.2f}s)")
+    return 0
+
+
+# ---------------- memory: typed schema vs. plain read_csv ----------------
+
+def synthetic_tables(rows, per_kafla=50, seed=1):
+    """Realistic Kafla/Zaireen frames with ``rows`` Zaireen."""
+    import numpy as np
+    import pandas as pd
+
+    rng = np.random.default_rng(seed)
+    n_kafla = max(1, rows // per_kafla)
+    cities = ["Karachi", "Lahore", "Islamabad", "Quetta", "Peshawar", "Multan", "Hyderabad", "Gilgit", "Skardu"]
+    provinces = ["Sindh", "Punjab", "ICT", "Balochistan", "KPK", "GB"]
+    kafla = pd.DataFrame({
+        "Kafla Code": [f"{i:08x}" for i in rng.choice(16 ** 7, n_kafla, replace=False)],
+        "Kafla Name": [f"Kafla {i}" for i in range(n_kafla)],
+        "City": rng.choice(cities, n_kafla),
+        "Province": rng.choice(provinces, n_kafla),
+        "Country": "Pakistan",
+        "Salar Name": [f"Salar {i}" for i in range(n_kafla)],
+        "Salar CNIC": [f"42101{n:08d}" for n in rng.integers(0, 10 ** 8, n_kafla)],
+        "Salar Contact": [f"03{n:09d}" for n in rng.integers(0, 10 ** 9, n_kafla)],
+        "Contact": "",
+        "Departure Date": pd.Timestamp("2025-08-01") + pd.to_timedelta(rng.integers(0, 60, n_kafla), unit="D"),
+        "Created At": pd.Timestamp("2025-06-01") + pd.to_timedelta(rng.integers(0, 60 * 86400, n_kafla), unit="s"),
+    })
+    zaireen = pd.DataFrame({
+        "Kafla Code": rng.choice(kafla["Kafla Code"].to_numpy(), rows),
+        "Zaireen ID": [f"{i:08x}" for i in rng.choice(16 ** 8, rows, replace=False)],
+        "Zaireen Name": [f"ZAIREEN {i} NAME" for i in range(rows)],
+        "Passport Number": [f"AB{i:07d}" for i in range(rows)],
+        "Nationality": rng.choice(["PAK", "PAK", "PAK", "PAK", "IND", "AFG", "GBR"], rows),
+        "Date of Birth": pd.Timestamp("1945-01-01") + pd.to_timedelta(rng.integers(0, 75 * 365, rows), unit="D"),
+        "Sex": rng.choice(["M", "F"], rows),
+        "Expiry Date": pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 10 * 365, rows), unit="D"),
+        "Scan Time": pd.Timestamp("2025-07-01") + pd.to_timedelta(rng.integers(0, 30 * 86400, rows), unit="s"),
+        "Iran Visa": "",
+        "Iraq Visa": "",
+        "Contact": [f"03{n:09d}" for n in rng.integers(0, 10 ** 9, rows)],
+    })
+    return kafla, zaireen
+
+
+def memory(args):
+    import tracemalloc
+
+    import pandas as pd
+    import schema
+
+    workdir = Path(tempfile.mkdtemp(prefix="zaireen-memory-"))
+    _, zaireen = synthetic_tables(args.rows)
+    csv_path = workdir / "zaireen.csv"
+    zaireen.to_csv(csv_path, index=False)
+    print(f"{args.rows:,} Zaireen rows, CSV {csv_path.stat().st_size / 1e6:.1f} MB")
+
+    # tracemalloc counts shared objects (e.g. the empty string) once,
+    # unlike memory_usage(deep=True)
+    def traced(build):
+        tracemalloc.start()
+        start = time.perf_counter()
+        value = build()
+        elapsed = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        return value, size, elapsed
+
+    plain, plain_mb, plain_time = traced(lambda: pd.read_csv(csv_path))
+    typed, typed_mb, typed_time = traced(lambda: schema.read_csv(csv_path, "zaireen"))
+    print(f"frame   plain read_csv  {plain_mb:7.1f} MB ({plain_time:.2f}s)")
+    print(f"        schema.read_csv {typed_mb:7.1f} MB ({typed_time:.2f}s)  -> {plain_mb / typed_mb:.1f}x smaller")
+    for col in schema.CATEGORICAL["zaireen"] + schema.DATES["zaireen"]:
+        before = plain[col].memory_usage(deep=True) / 1e6
+        after = typed[col].memory_usage(deep=True) / 1e6
+        print(f"        {col:15} {before:6.2f} MB -> {after:5.2f} MB")
+
+    columns = typed[schema.ZAIREEN_COLUMNS]
+    _, dict_mb, _ = traced(lambda: columns.to_dict("records"))
+    _, record_mb, _ = traced(lambda: schema.ZaireenRecord.from_frame(typed))
+    print(f"rows    dict per row    {dict_mb:7.1f} MB")
+    print(f"        ZaireenRecord   {record_mb:7.1f} MB  -> {dict_mb / record_mb:.1f}x smaller")
+    return 0
+
+
+# ---------------- validate: rule engine over a full season ----------------
+
+def validate(args):
+    import numpy as np
+    import pandas as pd
+
+    import validation
+
+    kafla, zaireen = synthetic_tables(args.rows)
+    # Seed the kinds of mistakes the rules exist for
+    rng = np.random.default_rng(2)
+    bad = rng.choice(len(zaireen), len(zaireen) // 100, replace=False)
+    zaireen.loc[bad[0::4], "Date of Birth"] = zaireen.loc[bad[0::4], "Date of Birth"] + pd.DateOffset(years=100)
+    zaireen.loc[bad[1::4], "Expiry Date"] = None
+    zaireen.loc[bad[2::4], "Contact"] = "0300-123"
+    zaireen.loc[bad[3::4], "Passport Number"] = zaireen["Passport Number"].iloc[0]
+    kafla.loc[kafla.index[::10], "Departure Date"] = None
+    print(f"{len(zaireen):,} Zaireen in {len(kafla):,} Kafla, {len(validation.RULES)} rules")
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        report = validation.run_checks(zaireen, kafla, today="2025-07-15")
+        timings.append(time.perf_counter() - start)
+    print(f"run_checks  best {min(timings):.3f}s  median {sorted(timings)[len(timings) // 2]:.3f}s")
+    print(f"{len(report):,} exception(s)")
+    print(report.groupby(["Severity", "Rule"]).size().to_string())
+    return 0
+
+
+# ---------------- backup: full vs. nightly incremental ----------------
+
+def backup_bench(args):
+    import numpy as np
+
+    workdir = Path(tempfile.mkdtemp(prefix="zaireen-backup-"))
+    os.chdir(workdir)
+    import backup
+    import data_store
+    import locking
+    import schema
+
+    kafla, zaireen = synthetic_tables(args.rows)
+    locking.atomic_write_csv(kafla, data_store.KAFLA_CSV)
+    locking.atomic_write_csv(zaireen, data_store.ZAIREEN_CSV)
+    rng = np.random.default_rng(3)
+
+    def add_docs(rows):
+        for row in rows.itertuples():
+            folder = data_store.BASE_DIR / row[1] / "zaireen" / row[4]
+            folder.mkdir(parents=True, exist_ok=True)
+            (folder / "passport.jpg").write_bytes(rng.bytes(args.doc_kb * 1024))
+
+    add_docs(zaireen.head(args.docs))
+    data_store.compact()
+    dest = workdir / "backup"
+
+    def timed_backup(label):
+        start = time.perf_counter()
+        manifest = backup._load_manifest(backup.run_backup(dest))
+        shipped = manifest["shipped"]
+        print(f"{label:12} {time.perf_counter() - start:6.2f}s  {len(manifest['files']):,} file(s), "
+              f"{shipped['blobs']:,} blob(s), {shipped['bytes'] / 1e6:.1f} MB shipped")
+
+    print(f"{args.rows:,} Zaireen, {args.docs:,} document(s) of {args.doc_kb} KB")
+    timed_backup("full")
+    # A day's work: a new Kafla's Zaireen, some edits and their scans
+    new_rows = synthetic_tables(args.rows // 100, seed=4)[1]
+    data_store.insert_zaireen(new_rows.assign(**{"Passport Number": "N" + new_rows["Passport Number"]})
+                              .astype(str).to_dict("records"))
+    for row in zaireen.sample(args.edits, random_state=5).itertuples():
+        data_store.update_zaireen(row[1], row[4], {"Contact": "03000000000"})
+    add_docs(zaireen.tail(args.docs // 50))
+    timed_backup("incremental")
+
+    restored = workdir / "restored"
+    start = time.perf_counter()
+    backup.restore(dest, restored)
+    live = data_store.load_zaireen()
+    back = schema.read_csv(restored / data_store.ZAIREEN_CSV, "zaireen")
+    same = len(back) == len(live) and set(back["Passport Number"]) == set(live["Passport Number"].astype(str))
+    print(f"restore      {time.perf_counter() - start:6.2f}s  {len(back):,} Zaireen, matches live: {same}")
+    return 0 if same else 1
+
+
+# ---------------- reconcile: docs tree scan, migrate and GC ----------------
+
+def reconcile_bench(args):
+    workdir = Path(tempfile.mkdtemp(prefix="zaireen-reconcile-"))
+    os.chdir(workdir)
+    import data_store
+    import locking
+    import reconcile
+
+    kafla, zaireen = synthetic_tables(args.rows)
+    locking.atomic_write_csv(kafla, data_store.KAFLA_CSV)
+    locking.atomic_write_csv(zaireen, data_store.ZAIREEN_CSV)
+
+    # Mostly canonical files, plus both legacy layouts and deleted records
+    docs = data_store.BASE_DIR
+    for i, row in enumerate(zaireen.itertuples(index=False)):
+        code, zid, passport = row[0], row[1], row[3]
+        if i % 10 < 7:
+            path = docs / code / "zaireen" / passport / "passport.jpg"
+        elif i % 10 < 9:
+            path = docs / "zaireen_docs" / code / passport / f"{passport}_passport.jpg"
+        else:
+            path = docs / "zaireen_docs" / zid / "passport.pdf"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    for i in range(args.rows // 20):
+        path = docs / kafla["Kafla Code"].iloc[i % len(kafla)] / "zaireen" / f"GONE{i}" / "iran.jpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x")
+    time.sleep(reconcile.RACY_NS / 1e9)
+
+    def timed_scan(label, **kwargs):
+        start = time.perf_counter()
+        files, stats = reconcile.scan(**kwargs)
+        print(f"{label:24} {time.perf_counter() - start:6.2f}s  {len(files):,} file(s), "
+              f"{stats['listed']:,}/{stats['dirs']:,} folder(s) listed")
+        return files
+
+    timed_scan("full scan, 1 worker", workers=1, use_cache=False)
+    files = timed_scan(f"full scan, {reconcile.WORKERS} workers", use_cache=False)
+    timed_scan("rerun, nothing changed")
+    for code in kafla["Kafla Code"].iloc[:3]:
+        (docs / code / "zaireen" / "NEW").mkdir(exist_ok=True)
+    time.sleep(reconcile.RACY_NS / 1e9)
+    timed_scan("rerun, 3 Kaflas changed")
+
+    start = time.perf_counter()
+    report = reconcile.build_report(files)
+    print(f"{'report':24} {time.perf_counter() - start:6.2f}s  {report['Status'].value_counts().to_dict()}")
+    moved = reconcile.migrate(report)
+    removed, _ = reconcile.collect_garbage(report, grace=0)
+    after = reconcile.build_report(reconcile.scan()[0])["Status"].value_counts().to_dict()
+    print(f"migrated {moved:,}, removed {removed:,}; after: {after}")
+    return 0 if set(after) == {"ok"} and after["ok"] == len(zaireen) else 1
+
+
+# ---------------- dashboard: raw-row vs. pre-binned figures ----------------
+
+def dashboard(args):
+    import plotly.express as px
+
+    import charts
+    import schema
+
+    def raw_figures(merged):
+        # What dashboard.py drew before: px over the raw merged rows
+        kafla_counts = merged["Kafla Name"].value_counts().reset_index()
+        kafla_counts.columns = ["Kafla", "Total Zaireen"]
+        city_counts = merged["City"].value_counts()
+        city_counts = city_counts[city_counts > 0].reset_index()
+        city_counts.columns = ["City", "Total Zaireen"]
+        return [
+            px.bar(kafla_counts, x="Kafla", y="Total Zaireen"),
+            px.pie(merged, names="Sex"),
+            px.bar(city_counts, x="City", y="Total Zaireen"),
+            px.histogram(merged, x="Province", color="Kafla Name", barmode="group"),
+        ]
+
+    def binned_figures(merged):
+        return [charts.kafla_bar(merged), charts.gender_pie(merged),
+                charts.city_bar(merged), charts.province_bar(merged, args.top)]
+
+    print(f"{'rows':>8}  {'figures':8} {'build':>7} {'to_json':>8} {'payload':>9}")
+    for rows in args.rows:
+        kafla, zaireen = synthetic_tables(rows)
+        merged = schema.coerce(zaireen, "zaireen").merge(
+            schema.coerce(kafla, "kafla"), on="Kafla Code", how="left", suffixes=("", " (Kafla)"))
+        for label, build in (("raw", raw_figures), ("binned", binned_figures)):
+            start = time.perf_counter()
+            figures = build(merged)
+            built = time.perf_counter() - start
+            start = time.perf_counter()
+            payload = sum(len(fig.to_json()) for fig in figures)
+            encoded = time.perf_counter() - start
+            print(f"{rows:>8,}  {label:8} {built:6.2f}s {encoded:7.2f}s {payload / 1e6:7.2f} MB")
+    return 0
+
+
+# ---------------- previews: per-view rendering vs. cached thumbnails ----------------
+
+def previews_bench(args):
+    import numpy as np
+    from PIL import Image
+
+    workdir = Path(tempfile.mkdtemp(prefix="zaireen-previews-"))
+    os.chdir(workdir)
+    import previews
+
+    # A phone photo per certificate; half of them uploaded as scanned PDFs
+    rng = np.random.default_rng(5)
+    photo = Image.fromarray(rng.integers(0, 255, (2000, 1500, 3), dtype=np.uint8))
+    jpg, pdf = workdir / "photo.jpg", workdir / "scan.pdf"
+    photo.save(jpg, quality=85)
+    photo.save(pdf, "PDF", resolution=150)
+    sources = [jpg.read_bytes(), pdf.read_bytes()]
+    folders = ["salar_cnic", "fitness", "coordinate", "vehicles", "others"]
+    files = []
+    for k in range(args.kaflas):
+        for i, folder in enumerate(folders):
+            scanned = (k + i) % 2
+            path = Path("docs") / "convoy_docs" / f"K{k:05d}" / folder / ("doc.pdf" if scanned else "doc.jpg")
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Trailing bytes make every file distinct, so no render is shared
+            path.write_bytes(sources[scanned] + f"\n%{k}\n".encode())
+            files.append(path)
+
+    sample = files[: args.sample]
+    start = time.perf_counter()
+    for path in sample:
+        previews.render(path.read_bytes(), path.suffix)
+    naive = (time.perf_counter() - start) / len(sample) * len(files)
+    print(f"render on every view      {naive:7.2f}s per view (extrapolated from {len(sample)} files)")
+
+    start = time.perf_counter()
+    rendered, _ = previews.rebuild()
+    print(f"background render, once   {time.perf_counter() - start:7.2f}s for {rendered:,} file(s)")
+
+    def view():
+        return [previews.folder_preview(Path("docs") / "convoy_docs" / f"K{k:05d}" / f)
+                for k in range(args.kaflas) for f in folders]
+
+    for label in ("cached view (cold)", "cached view (warm)"):
+        start = time.perf_counter()
+        uris = view()
+        print(f"{label:25} {time.perf_counter() - start:7.3f}s per view, "
+              f"{sum(map(len, uris)) / 1e6:.2f} MB of thumbnails")
+    return 0 if all(u.startswith("data:image/jpeg") for u in uris) else 1
+
+
+# ---------------- kaflas: eager labels + scans vs. the directory ----------------
+
+def kaflas_bench(args):
+    import random
+
+    import schema
+    from kafla_directory import KaflaDirectory
+
+    rng = random.Random(7)
+    print(f"{'kaflas':>8}  {'eager page':>10} {'build':>8} {'search+pick':>12}")
+    for n in args.kaflas:
+        kafla, _ = synthetic_tables(n, per_kafla=1)
+        kafla = schema.coerce(kafla, "kafla")
+        codes = rng.sample(kafla["Kafla Code"].tolist(), min(args.picks, n))
+
+        # What a page did before: every label, then a scan for the picked Kafla
+        start = time.perf_counter()
+        for code in codes:
+            labels = kafla["Kafla Name"].astype(str) + " (" + kafla["Salar Name"].astype(str) + ")"
+            dict(zip(labels, kafla["Kafla Code"]))
+            kafla[kafla["Kafla Code"] == code].iloc[0]
+        eager = (time.perf_counter() - start) / len(codes)
+
+        start = time.perf_counter()
+        directory = KaflaDirectory(kafla)
+        built = time.perf_counter() - start
+
+        # A volunteer types the start of the Kafla name, then picks it
+        queries = [directory.get(code)["Kafla Name"][: rng.randint(3, 9)] for code in codes]
+        start = time.perf_counter()
+        for code, query in zip(codes, queries):
+            directory.search(query)
+            directory.get(code)
+        picked = (time.perf_counter() - start) / len(codes)
+
+        # Prefix search must agree with a plain scan of the labels
+        def matches(label, query):
+            words = label.casefold().split()
+            return any(" ".join(words[i:]).lstrip("(").startswith(query.casefold()) for i in range(len(words)))
+
+        for query in queries[:20]:
+            expected = sorted((c for c, label in directory.labels.items() if matches(label, query)),
+                              key=lambda c: (directory.labels[c].casefold(), c))
+            if directory.search(query, limit=n) != expected:
+                print(f"search mismatch for {query!r}")
+                return 1
+        print(f"{n:>8,}  {eager * 1e3:8.2f}ms {built:7.2f}s {picked * 1e3:10.3f}ms")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("stress", help="N processes hammering inserts, deletes and edits")
+    p.add_argument("--replicas", type=int, default=4)
+    p.add_argument("--ops", type=int, default=100, help="inserts per replica (every other one is deleted)")
+    p.add_argument("--increments", type=int, default=20, help="optimistic edits per replica")
+    p.set_defaults(func=stress)
+
+    p = sub.add_parser("quality", help="pre-OCR quality gate vs. read_mrz time")
+    p.add_argument("--good", nargs="+", default=["temp_passport.jpg"], help="readable captures (files or folders)")
+    p.add_argument("--bad", nargs="*", help="failed captures; synthesised from --good when omitted")
+    p.set_defaults(func=quality)
+
+    p = sub.add_parser("memory", help="memory footprint of the typed schema vs. plain frames")
+    p.add_argument("--rows", type=int, default=100000)
+    p.set_defaults(func=memory)
+
+    p = sub.add_parser("validate", help="time the validation rules over a synthetic season")
+    p.add_argument("--rows", type=int, default=100000)
+    p.add_argument("--repeat", type=int, default=5)
+    p.set_defaults(func=validate)
+
+    p = sub.add_parser("backup", help="full vs. incremental backup time, then a restore")
+    p.add_argument("--rows", type=int, default=20000)
+    p.add_argument("--docs", type=int, default=2000, help="passport scans on disk")
+    p.add_argument("--doc-kb", type=int, default=300)
+    p.add_argument("--edits", type=int, default=20, help="single-row edits in the day's work")
+    p.set_defaults(func=backup_bench)
+
+    p = sub.add_parser("reconcile", help="docs tree scan (full vs. incremental), migrate and GC")
+    p.add_argument("--rows", type=int, default=20000)
+    p.set_defaults(func=reconcile_bench)
+
+    p = sub.add_parser("dashboard", help="figure build time and JSON payload, raw rows vs. pre-binned")
+    p.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--top", type=int, default=10, help="Kaflas shown in the Province chart")
+    p.set_defaults(func=dashboard)
+
+    p = sub.add_parser("previews", help="convoy status thumbnails: per-view rendering vs. the preview cache")
+    p.add_argument("--kaflas", type=int, default=200)
+    p.add_argument("--sample", type=int, default=50, help="files rendered to time per-view rendering")
+    p.set_defaults(func=previews_bench)
+
+    p = sub.add_parser("kaflas", help="Kafla picker: eager labels and scans vs. the directory index")
+    p.add_argument("--kaflas", type=int, nargs="+", default=[1000, 10000, 100000])
+    p.add_argument("--picks", type=int, default=200)
+    p.set_defaults(func=kaflas_bench)
+
+    args = parser.parse_args(argv)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
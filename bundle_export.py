@@ -0,0 +1,155 @@
+"""Streaming ZIP export of a Kafla's full document bundle.
+
+``iter_bundle`` walks ``docs/<kafla>/...`` and ``docs/convoy_docs/<kafla>/...``
+and yields the archive as it is produced, a file chunk at a time, so even a
+multi-GB bundle never sits in memory or on disk. JPG/PNG/PDF entries are
+already compressed and are stored as-is; everything else is deflated.
+
+Streamlit's ``download_button`` needs the whole payload up front, so large
+bundles are served by a small side endpoint instead::
+
+    python bundle_export.py serve --port 8502   # GET /<kafla_code>.zip
+    python bundle_export.py <kafla_code> > bundle.zip
+
+Point ``ZAIREEN_BUNDLE_URL`` at the endpoint (e.g. through the reverse proxy)
+and the Convoy Documents page links to it. Without it the page only builds
+bundles up to ``IN_PAGE_LIMIT`` in memory and points larger ones at the
+endpoint.
+
+The endpoint has no authentication of its own: anyone who can reach it can
+download any Kafla's passports. Keep it bound to localhost and expose it only
+through the reverse proxy that guards the app.
+
+PDFs generated by the Convoy Documents page (``base_summary.pdf`` and the
+combined PDF, written next to the upload folders) are not documents and are
+left out of the bundle.
+"""
+import os
+import re
+import zipfile
+from pathlib import Path
+
+import data_store
+import kafla_directory
+
+CONVOY_DIR = data_store.BASE_DIR / "convoy_docs"
+STORED_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".pdf", ".zip", ".gz", ".heic"}
+CHUNK_SIZE = 1 << 20
+BUNDLE_URL = os.environ.get("ZAIREEN_BUNDLE_URL", "").rstrip("/")
+# Largest bundle the page may build in memory when no endpoint is configured
+IN_PAGE_LIMIT = 50 * 10 ** 6
+
+
+class _Sink:
+    """Write-only buffer the ZipFile writes into; drained after every chunk."""
+
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data):
+        if data:
+            self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        parts, self._parts = self._parts, []
+        return parts
+
+
+def bundle_files(kafla_code):
+    """Yield ``(archive name, path)`` for every document of a Kafla."""
+    roots = [
+        ("kafla", data_store.BASE_DIR / kafla_code),
+        ("convoy", CONVOY_DIR / kafla_code),
+    ]
+    for prefix, root in roots:
+        if not root.is_dir():
+            continue
+        for dirpath, dirnames, filenames in os.walk(root):
+            # Skip hidden helpers (.originals, temp files, locks)
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            # Uploads live in subfolders; files at the convoy root are generated PDFs
+            if prefix == "convoy" and Path(dirpath) == root:
+                continue
+            for name in sorted(filenames):
+                if name.startswith("."):
+                    continue
+                path = Path(dirpath) / name
+                yield f"{kafla_code}/{prefix}/{path.relative_to(root).as_posix()}", path
+
+
+def iter_bundle(kafla_code, chunk_size=CHUNK_SIZE):
+    """Yield the ZIP archive for ``kafla_code`` as a stream of byte chunks."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, "w", allowZip64=True) as zf:
+        for arcname, path in bundle_files(kafla_code):
+            info = zipfile.ZipInfo.from_file(path, arcname)
+            if path.suffix.lower() in STORED_SUFFIXES:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            force_zip64 = info.file_size > zipfile.ZIP64_LIMIT
+            with open(path, "rb") as src, zf.open(info, "w", force_zip64=force_zip64) as dst:
+                while True:
+                    chunk = src.read(chunk_size)
+                    if not chunk:
+                        break
+                    dst.write(chunk)
+                    yield from sink.drain()
+            yield from sink.drain()
+    yield from sink.drain()
+
+
+def bundle_size(kafla_code):
+    return sum(path.stat().st_size for _, path in bundle_files(kafla_code))
+
+
+def bundle_url(kafla_code):
+    return f"{BUNDLE_URL}/{kafla_code}.zip" if BUNDLE_URL else ""
+
+
+# ---------------- Streaming endpoint ----------------
+
+def serve(host="127.0.0.1", port=8502):
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class BundleHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            match = re.fullmatch(r"/([\w-]+)\.zip", self.path.split("?")[0])
+            code = match.group(1) if match else None
+            if code is None or code not in kafla_directory.directory():
+                self.send_error(404, "Unknown Kafla")
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "application/zip")
+            self.send_header("Content-Disposition", f'attachment; filename="{code}_documents.zip"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for chunk in iter_bundle(code):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+
+    print(f"Serving Kafla bundles on http://{host}:{port}/<kafla_code>.zip")
+    ThreadingHTTPServer((host, port), BundleHandler).serve_forever()
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    parser = argparse.ArgumentParser(description="Export a Kafla's documents as a ZIP stream")
+    parser.add_argument("kafla_code", help="Kafla code, or 'serve' to run the HTTP endpoint")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    args = parser.parse_args()
+
+    if args.kafla_code == "serve":
+        serve(args.host, args.port)
+    else:
+        for chunk in iter_bundle(args.kafla_code):
+            sys.stdout.buffer.write(chunk)
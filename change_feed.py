@@ -0,0 +1,202 @@
+"""Append-only change log of Kafla/Zaireen inserts, updates and deletes.
+
+Every write made through ``data_store`` is recorded here as one JSON line
+with a monotonically increasing sequence number. ``data_store`` replays the
+entries a cached frame has not seen yet instead of re-reading the CSVs, and
+pages remember the last sequence they rendered so they can tell (cheaply)
+whether anything changed since.
+
+The log is also the write-ahead journal: entries are fsynced before the
+CSVs are touched, so the tables can always be rebuilt from the latest
+snapshot plus the entries after it. ``rotate`` seals the current segment
+under ``docs/journal/<seq>.jsonl`` when a snapshot is taken and starts a new
+one whose first line is a ``base`` marker carrying the sequence on.
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+
+import streamlit as st
+
+import locking
+
+FEED_FILE = Path("docs") / "changes.jsonl"
+SEGMENT_DIR = FEED_FILE.parent / "journal"
+# Entries kept in memory; older history falls back to a full reload
+MAX_RETAINED = 10000
+
+_lock = threading.RLock()
+_entries = deque(maxlen=MAX_RETAINED)
+_seq = 0
+_offset = 0
+_inode = None
+
+
+def _reset():
+    global _seq, _offset, _inode
+    _entries.clear()
+    _seq = 0
+    _offset = 0
+    _inode = None
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _line(entry):
+    return (json.dumps(entry, default=str) + "\n").encode("utf-8")
+
+
+def poll():
+    """Pick up entries appended since the last call; return the latest seq."""
+    global _seq, _offset, _inode
+    with _lock:
+        try:
+            stat = FEED_FILE.stat()
+        except FileNotFoundError:
+            if _offset:
+                _reset()
+            return _seq
+        if stat.st_size < _offset or (_inode is not None and stat.st_ino != _inode):
+            # Log was truncated or rotated; start over from the top
+            _reset()
+        _inode = stat.st_ino
+        size = stat.st_size
+        if size == _offset:
+            return _seq
+        with open(FEED_FILE, "rb") as f:
+            f.seek(_offset)
+            chunk = f.read(size - _offset)
+        # Only consume complete lines; a half-written tail is read next time
+        end = chunk.rfind(b"\n") + 1
+        for line in chunk[:end].splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                if entry["op"] != "base":
+                    _entries.append(entry)
+                _seq = entry["seq"]
+        _offset += end
+        return _seq
+
+
+def latest_seq():
+    return poll()
+
+
+def segment_bytes():
+    """Size of the current journal segment."""
+    with _lock:
+        poll()
+        return _offset
+
+
+def append_many(table, changes):
+    """Durably record ``{"op", "key", "row"}`` changes; return the last seq."""
+    global _seq, _offset, _inode
+    with locking.file_lock("data"), _lock:
+        poll()
+        ts = _now()
+        entries = [
+            {"seq": _seq + i, "ts": ts, "table": table, "op": c["op"], "key": c["key"], "row": c.get("row")}
+            for i, c in enumerate(changes, 1)
+        ]
+        data = b"".join(_line(e) for e in entries)
+        FEED_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(FEED_FILE, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        _entries.extend(entries)
+        _seq = entries[-1]["seq"]
+        _offset += len(data)
+        _inode = FEED_FILE.stat().st_ino
+        return _seq
+
+
+def append(table, op, key, row=None):
+    """Record one change and return its sequence number."""
+    return append_many(table, [{"op": op, "key": key, "row": row}])
+
+
+def rotate():
+    """Seal the current segment and continue the log in a fresh one."""
+    with locking.file_lock("data"), _lock:
+        seq = poll()
+        if FEED_FILE.exists():
+            locking.atomic_copy(FEED_FILE, SEGMENT_DIR / f"{seq:012d}.jsonl")
+        locking.atomic_write_bytes(FEED_FILE, _line({"seq": seq, "ts": _now(), "op": "base"}))
+        _reset()
+        poll()
+        return seq
+
+
+def read_journal(after_seq=0, base=None):
+    """Every entry after ``after_seq`` still on disk, sealed segments included.
+
+    ``base`` is the folder holding ``changes.jsonl`` (default: the live one),
+    so a restored copy of the tree can be replayed too.
+    """
+    base = Path(base) if base is not None else FEED_FILE.parent
+    files = sorted((base / SEGMENT_DIR.name).glob("*.jsonl"))
+    files = [f for f in files if f.stem.isdigit() and int(f.stem) > after_seq]
+    files.append(base / FEED_FILE.name)
+    entries = {}
+    for path in files:
+        if not path.exists():
+            continue
+        data = path.read_bytes()
+        for line in data[:data.rfind(b"\n") + 1].splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                if entry["op"] != "base" and entry["seq"] > after_seq:
+                    entries[entry["seq"]] = entry
+    return [entries[seq] for seq in sorted(entries)]
+
+
+def changes_since(seq, table=None):
+    """Entries after ``seq``, or None if that history is no longer retained."""
+    with _lock:
+        latest = poll()
+        if seq >= latest:
+            return []
+        if not _entries or _entries[0]["seq"] > seq + 1:
+            return None
+        return [e for e in _entries if e["seq"] > seq and (table is None or e["table"] == table)]
+
+
+# ---------------- Page subscriptions ----------------
+
+def subscribe(page):
+    """Changes since this session last rendered ``page``; marks them seen."""
+    state_key = f"_feed_seq_{page}"
+    seen = st.session_state.get(state_key)
+    latest = latest_seq()
+    st.session_state[state_key] = latest
+    if seen is None:
+        return []
+    return changes_since(seen) or []
+
+
+def auto_refresh(page, interval=3, max_wait=600):
+    """Optional live mode: wait for new changes, then rerun the page.
+
+    Call at the very end of a page. Polling only stats the feed file, so an
+    idle page costs next to nothing while it waits.
+    """
+    if not st.sidebar.toggle("🔄 Live updates", key=f"_live_{page}"):
+        return
+    seen = st.session_state.get(f"_feed_seq_{page}", latest_seq())
+    status = st.sidebar.empty()
+    waited = 0
+    while waited < max_wait:
+        if latest_seq() > seen:
+            st.rerun()
+        # Touching an element lets Streamlit stop this loop on user input
+        status.caption(f"Live · up to change #{seen}")
+        time.sleep(interval)
+        waited += interval
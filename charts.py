@@ -0,0 +1,74 @@
+"""Dashboard figures built from pre-binned counts.
+
+Plotly Express fed raw rows (``px.pie(df, names=...)``, ``px.histogram``)
+embeds every row in the figure JSON it sends to the browser, so the payload
+grows with each registration. Here every chart is drawn from a small
+aggregated frame (one row per category), which keeps the figure size tied
+to the number of categories, and built figures are cached per data version
+so reruns and other sessions reuse them.
+"""
+import plotly.express as px
+
+import data_store
+
+TEMPLATE = "plotly_dark"
+COUNT = "Total Zaireen"
+OTHER = "Other"
+
+
+def counts(df, cols):
+    """Zaireen per combination of ``cols``, largest first."""
+    binned = df.groupby(cols, observed=True).size().reset_index(name=COUNT)
+    return binned.sort_values(COUNT, ascending=False, ignore_index=True)
+
+
+def top_n(binned, col, n):
+    """Keep the ``n`` largest values of ``col``; fold the rest into "Other"."""
+    keep = binned.groupby(col, observed=True)[COUNT].sum().nlargest(n).index
+    binned = binned.copy()
+    binned[col] = binned[col].astype(str).where(binned[col].isin(keep), OTHER)
+    group = [c for c in binned.columns if c != COUNT]
+    return binned.groupby(group, sort=False)[COUNT].sum().reset_index()
+
+
+def cached(name, season, build):
+    """Figure ``name`` for ``season``, rebuilt only when the data changes."""
+    return data_store.derived(f"chart_{name}_{season}", build)
+
+
+def kafla_bar(merged):
+    binned = counts(merged, ["Kafla Name"]).rename(columns={"Kafla Name": "Kafla"})
+    return px.bar(
+        binned, x="Kafla", y=COUNT,
+        title="🥮 Zaireen per Kafla | فی قافلہ زائرین",
+        template=TEMPLATE, color_discrete_sequence=["#FFD700"],
+    )
+
+
+def gender_pie(merged):
+    binned = counts(merged, ["Sex"])
+    return px.pie(
+        binned, names="Sex", values=COUNT,
+        title="♅ Gender Split | صنفی تناسب",
+        template=TEMPLATE, color_discrete_sequence=px.colors.sequential.RdBu,
+    )
+
+
+def city_bar(merged):
+    return px.bar(
+        counts(merged, ["City"]), x="City", y=COUNT,
+        title="🏛️ City-wise Distribution | شہروں کے لحاظ سے تقسیم",
+        template=TEMPLATE, color_discrete_sequence=["#00BFFF"],
+    )
+
+
+def province_bar(merged, top=None):
+    """Zaireen per Province and Kafla; ``top`` limits the Kaflas shown."""
+    binned = counts(merged, ["Province", "Kafla Name"])
+    if top:
+        binned = top_n(binned, "Kafla Name", top)
+    return px.bar(
+        binned, x="Province", y=COUNT, color="Kafla Name",
+        title="🗺️ Kafla by Province | صوبہ وار قافلے",
+        template=TEMPLATE, barmode="group",
+    )
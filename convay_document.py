@@ -1,45 +1,52 @@
 import streamlit as st
 import pandas as pd
-import os
-from pathlib import Path
+from io import BytesIO
 from PIL import Image
 from PyPDF2 import PdfMerger
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image as RLImage, Table, TableStyle
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.units import inch
 from reportlab.lib import colors
+import data_store
+import kafla_directory
+from image_ingest import store_document
+import bundle_export
+import previews
+from schema import ZaireenRecord, fmt_date
+import seasons
 
 # App Config
 #st.set_page_config(page_title="Convoy Documents Submission", layout="centered")
 st.title("🚍 Convoy Documents Submission | قافلے کی دستاویزات")
 
 # Setup folders
-BASE_DIR = Path("docs")
+BASE_DIR = data_store.BASE_DIR
 DOCS_DIR = BASE_DIR / "convoy_docs"
 DOCS_DIR.mkdir(parents=True, exist_ok=True)
-KAFLA_CSV = Path("kafla.csv")
+KAFLA_CSV = data_store.KAFLA_CSV
 
 if not KAFLA_CSV.exists():
     st.error("⚠️ No Kafla data found. Please register a Kafla first.")
     st.stop()
 
-kafla_df = pd.read_csv(KAFLA_CSV)
-kafla_names = kafla_df.apply(lambda row: f"{row['Kafla Name']} ({row['Salar Name']})", axis=1).tolist()
-kafla_map = dict(zip(kafla_names, kafla_df["Kafla Code"]))
+kaflas = kafla_directory.directory()
+kafla_code = kafla_directory.select_kafla("Select Kafla", "convoy_kafla")
 
-selected_kafla_name = st.selectbox("Select Kafla", options=kafla_names)
-
-if not selected_kafla_name or selected_kafla_name not in kafla_map:
+if kafla_code is None:
     st.warning("⚠️ Please select a valid Kafla.")
     st.stop()
 
-kafla_code = kafla_map[selected_kafla_name]
+selected_kafla_name = kaflas.label(kafla_code)
 kafla_dir = DOCS_DIR / kafla_code
 kafla_dir.mkdir(parents=True, exist_ok=True)
 
 st.markdown("### 📂 Upload Required Documents")
 
+# The uploaders keep their files across reruns: {file_id: stored name}
+if "stored_uploads" not in st.session_state:
+    st.session_state.stored_uploads = {}
+
 # Upload fields
 def save_upload(label, key, subfolder, allow_multiple=False):
     widget_key = f"{key}_{kafla_code}"
@@ -49,10 +56,13 @@ def save_upload(label, key, subfolder, allow_multiple=False):
         save_path = kafla_dir / subfolder
         save_path.mkdir(parents=True, exist_ok=True)
         for file in files if allow_multiple else [files]:
-            out_path = save_path / file.name
-            with open(out_path, "wb") as f:
-                f.write(file.read())
-            saved.append(file.name)
+            # Normalising an image takes about a second; do it once per upload
+            if file.file_id not in st.session_state.stored_uploads:
+                stored = store_document(file.read(), save_path / file.name)
+                # Thumbnail for the status table, rendered off the page's thread
+                previews.schedule(stored)
+                st.session_state.stored_uploads[file.file_id] = stored.name
+            saved.append(st.session_state.stored_uploads[file.file_id])
         st.success(f"✅ Uploaded to {subfolder}: {', '.join(saved)}")
     return saved
 
@@ -63,27 +73,53 @@ submitted['Coordinate Document'] = save_upload("📍 Coordinate Document", "coor
 submitted['Vehicle Documents'] = save_upload("🚗 Vehicle Documents", "vehicle_docs", "vehicles", allow_multiple=True)
 submitted['Other Documents'] = save_upload("📌 Other Documents (if any)", "other_docs", "others", allow_multiple=True)
 
-# Document status table
+# Document status table: a thumbnail of the first document in each folder
+# (rendered in the background at upload), blank when nothing was submitted.
+# Thumbnails are inlined in the page, so only one page of Kaflas (those
+# matching the Kafla search above) is sent at a time.
 st.markdown("### 🗂️ Submission Status")
+STATUS_FOLDERS = {"Salar CNIC": "salar_cnic", "Fitness Cert": "fitness", "Coordinate": "coordinate",
+                  "Vehicles": "vehicles", "Others": "others"}
+STATUS_PAGE_SIZE = 10
+status_codes = kaflas.search(st.session_state.get("convoy_kafla_search", ""), limit=len(kaflas))
+status_pages = max(1, -(-len(status_codes) // STATUS_PAGE_SIZE))
+status_page = 1
+if status_pages > 1:
+    status_page = st.number_input(f"Page (of {status_pages})", min_value=1, max_value=status_pages, value=1,
+                                  key="status_page")
+    st.caption(f"{len(status_codes):,} Kafla(s) matching the search above, {STATUS_PAGE_SIZE} per page.")
 status_records = []
-all_kafla_codes = kafla_df["Kafla Code"].tolist()
-for code in all_kafla_codes:
-    name = kafla_df[kafla_df["Kafla Code"] == code].iloc[0]
-    name_label = f"{name['Kafla Name']} ({name['Salar Name']})"
+for code in status_codes[(status_page - 1) * STATUS_PAGE_SIZE: status_page * STATUS_PAGE_SIZE]:
     group_dir = DOCS_DIR / code
-    status = {
-        "Kafla": name_label,
-        "Salar CNIC": os.path.exists(group_dir / "salar_cnic"),
-        "Fitness Cert": os.path.exists(group_dir / "fitness"),
-        "Coordinate": os.path.exists(group_dir / "coordinate"),
-        "Vehicles": os.path.exists(group_dir / "vehicles"),
-        "Others": os.path.exists(group_dir / "others")
-    }
+    status = {"Kafla": kaflas.label(code)}
+    for column, folder in STATUS_FOLDERS.items():
+        status[column] = previews.folder_preview(group_dir / folder)
     status_records.append(status)
 
-status_df = pd.DataFrame(status_records)
-status_df = status_df.replace({True: "✅", False: "❌"})
-st.dataframe(status_df, use_container_width=True)
+status_df = pd.DataFrame(status_records, columns=["Kafla", *STATUS_FOLDERS])
+st.dataframe(
+    status_df, use_container_width=True, hide_index=True,
+    column_config={column: st.column_config.ImageColumn(column) for column in STATUS_FOLDERS},
+)
+
+# ---------------- ZIP BUNDLE SECTION ----------------
+st.markdown("### 📦 Full Document Bundle (ZIP)")
+bundle_bytes = bundle_export.bundle_size(kafla_code)
+st.caption(f"All Zaireen passports/visas and convoy documents of this Kafla ({bundle_bytes / 1e6:.1f} MB).")
+if bundle_export.bundle_url(kafla_code):
+    # Streamed by the bundle endpoint; nothing is built inside the app
+    st.link_button("📦 Download ZIP Bundle", bundle_export.bundle_url(kafla_code))
+elif bundle_bytes > bundle_export.IN_PAGE_LIMIT:
+    # A download_button holds the whole ZIP in memory; large bundles must stream
+    st.warning(f"⚠️ Bundles over {bundle_export.IN_PAGE_LIMIT / 1e6:.0f} MB are only served by the bundle "
+               "endpoint (`python bundle_export.py serve`, set ZAIREEN_BUNDLE_URL). Ask an admin to enable it.")
+elif st.button("📦 Prepare ZIP Bundle"):
+    st.download_button(
+        label="📥 Download ZIP Bundle",
+        data=b"".join(bundle_export.iter_bundle(kafla_code)),
+        file_name=f"{kafla_code}_documents.zip",
+        mime="application/zip"
+    )
 
 # ---------------- PDF COMBINE SECTION ----------------
 st.markdown("### 📄 Generate Final PDF")
@@ -97,7 +133,7 @@ if st.button("🧾 Generate Combined PDF"):
     styles = getSampleStyleSheet()
 
     # Title Page
-    elements.append(Paragraph(f"ZAIREEN LIST 2025 (KHI-GWD)", styles['Title']))
+    elements.append(Paragraph(f"ZAIREEN LIST {seasons.kafla_season(kafla_code)} (KHI-GWD)", styles['Title']))
     elements.append(Spacer(1, 0.2*inch))
     elements.append(Paragraph(f"Group: {selected_kafla_name}", styles['Heading2']))
     elements.append(Spacer(1, 0.2*inch))
@@ -106,23 +142,21 @@ if st.button("🧾 Generate Combined PDF"):
     elements.append(Spacer(1, 0.3*inch))
 
     # Zaireen list table
-    zaireen_path = BASE_DIR / "zaireen.csv"
-    if zaireen_path.exists():
-        zdf = pd.read_csv(zaireen_path)
-        zdf = zdf[zdf['Kafla Code'] == kafla_code]
-        if not zdf.empty:
-            table_data = [["Name", "Passport #", "DOB", "Nationality"]]
-            for _, row in zdf.iterrows():
-                table_data.append([row['Full Name'], row['Passport Number'], row['Date of Birth'], row['Nationality']])
-            t = Table(table_data)
-            t.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black)
-            ]))
-            elements.append(t)
-            elements.append(Spacer(1, 0.3*inch))
+    zdf = data_store.load_zaireen()
+    records = ZaireenRecord.from_frame(zdf[zdf['Kafla Code'] == kafla_code])
+    if records:
+        table_data = [["Name", "Passport #", "DOB", "Nationality"]]
+        for rec in records:
+            table_data.append([rec.name, rec.passport, fmt_date(rec.dob), rec.nationality])
+        t = Table(table_data)
+        t.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        elements.append(t)
+        elements.append(Spacer(1, 0.3*inch))
 
     # Save main summary PDF
     doc.build(elements)
@@ -140,14 +174,18 @@ if st.button("🧾 Generate Combined PDF"):
                 if file.suffix.lower() == ".pdf":
                     merger.append(str(file))
 
-    # Zaireen documents: passport, iran, iraq
-    for _, row in zdf.iterrows():
-        z_folder = BASE_DIR / "zaireen_docs" / row['ID']
-        if z_folder.exists():
-            for doc_type in ["passport", "iran", "iraq"]:
-                d_path = z_folder / f"{doc_type}.pdf"
-                if d_path.exists():
-                    merger.append(str(d_path))
+    # Zaireen documents: passport, iran, iraq (scans become one page each)
+    for rec in records:
+        for doc_type in ["passport", "iran", "iraq"]:
+            pdf_path = rec.doc_path(doc_type).with_suffix(".pdf")
+            img_path = rec.doc_path(doc_type)
+            if pdf_path.exists():
+                merger.append(str(pdf_path))
+            elif img_path.exists():
+                page = BytesIO()
+                Image.open(img_path).convert("RGB").save(page, "PDF", resolution=150)
+                page.seek(0)
+                merger.append(page)
 
     # Write final merged PDF
     merger.write(str(final_pdf_path))
@@ -1,39 +1,48 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from pathlib import Path
 from io import BytesIO
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
+import data_store
+import change_feed
+import seasons
+import charts
+from schema import display_frame
 
 # Page Config
 #st.set_page_config(page_title="📊 Dashboard | زائرین کی رپورٹ", layout="wide")
 st.title("📊 Zaireen Management Dashboard | زائرین کا انتظامی ڈیش بورڈ")
 
-# Load data
-base_path = Path("docs")
-kafla_file = Path("kafla.csv")
-zaireen_file = base_path / "zaireen.csv"
-
-if not kafla_file.exists() or not zaireen_file.exists():
+# Load data (shared read-only cache, see data_store.py)
+if not data_store.KAFLA_CSV.exists() or not data_store.ZAIREEN_CSV.exists():
     st.warning("⚠️ Required data not found. Make sure Kafla and Zaireen data is available.")
     st.stop()
 
-kafla_df = pd.read_csv(kafla_file)
-zaireen_df = pd.read_csv(zaireen_file)
-
-# Ensure required columns
-if "Contact" not in kafla_df.columns:
-    kafla_df["Contact"] = ""
-if "Contact" not in zaireen_df.columns:
-    zaireen_df["Contact"] = ""
-if "Sex" not in zaireen_df.columns:
-    zaireen_df["Sex"] = "Unknown"
+# Season: the active data by default; archived seasons only when asked for
+season_choice = st.sidebar.selectbox(
+    "📅 Season | سیزن", ["Active"] + seasons.archived_seasons()[::-1] + ["All seasons"]
+)
+if season_choice == "Active":
+    season = None
+    kafla_df = data_store.load_kafla()
+    zaireen_df = data_store.load_zaireen()
+elif season_choice == "All seasons":
+    season = "all"
+    kafla_df = seasons.load_all("kafla")
+    zaireen_df = seasons.load_all("zaireen")
+else:
+    season = season_choice
+    kafla_df = seasons.load_season(season, "kafla")
+    zaireen_df = seasons.load_season(season, "zaireen")
 
 # Merge both for aggregate analysis
-merged_df = zaireen_df.merge(kafla_df, on="Kafla Code", how="left")
+merged_df = seasons.merged(season)
+
+new_changes = change_feed.subscribe("dashboard")
+if new_changes:
+    st.caption(f"🔔 Updated with {len(new_changes)} new change(s) since your last view.")
 
 # Summary Metrics
 col1, col2, col3, col4 = st.columns(4)
@@ -47,54 +56,29 @@ st.markdown("---")
 # Charts Section
 st.markdown("### 📈 Visual Insights | بصری جائزہ")
 
+# Figures are drawn from per-category counts and cached per data version
 # 1. Zaireen per Kafla
-kafla_counts = merged_df['Kafla Name'].value_counts().reset_index()
-kafla_counts.columns = ['Kafla', 'Total Zaireen']
-kafla_chart = px.bar(
-    kafla_counts,
-    x='Kafla',
-    y='Total Zaireen',
-    title='🥮 Zaireen per Kafla | فی قافلہ زائرین',
-    template='plotly_dark',
-    color_discrete_sequence=['#FFD700']
-)
-st.plotly_chart(kafla_chart, use_container_width=True)
+st.plotly_chart(charts.cached("kafla", season, lambda: charts.kafla_bar(merged_df)), use_container_width=True)
 
 # 2. Gender Split
 if 'Sex' in merged_df.columns:
-    gender_chart = px.pie(
-        merged_df,
-        names='Sex',
-        title='♅ Gender Split | صنفی تناسب',
-        template='plotly_dark',
-        color_discrete_sequence=px.colors.sequential.RdBu
-    )
-    st.plotly_chart(gender_chart, use_container_width=True)
+    st.plotly_chart(charts.cached("gender", season, lambda: charts.gender_pie(merged_df)), use_container_width=True)
 
 # 3. City-wise Distribution
-city_counts = merged_df['City'].value_counts().reset_index()
-city_counts.columns = ['City', 'Total Zaireen']
-city_chart = px.bar(
-    city_counts,
-    x='City',
-    y='Total Zaireen',
-    title='🏛️ City-wise Distribution | شہروں کے لحاظ سے تقسیم',
-    template='plotly_dark',
-    color_discrete_sequence=['#00BFFF']
-)
-st.plotly_chart(city_chart, use_container_width=True)
+st.plotly_chart(charts.cached("city", season, lambda: charts.city_bar(merged_df)), use_container_width=True)
 
 # 4. Kafla vs Province
 if 'Province' in merged_df.columns:
-    prov_chart = px.histogram(
-        merged_df,
-        x='Province',
-        color='Kafla Name',
-        title='🗺️ Kafla by Province | صوبہ وار قافلے',
-        template='plotly_dark',
-        barmode='group'
+    top_kaflas = st.select_slider(
+        "Kaflas shown per Province | دکھائے گئے قافلے",
+        options=[5, 10, 20, 50, "All"], value=10,
+        help="The largest Kaflas are shown; the rest are combined as Other.",
+    )
+    top = None if top_kaflas == "All" else top_kaflas
+    st.plotly_chart(
+        charts.cached(f"province_{top}", season, lambda: charts.province_bar(merged_df, top)),
+        use_container_width=True,
     )
-    st.plotly_chart(prov_chart, use_container_width=True)
 
 st.markdown("---")
 
@@ -105,9 +89,9 @@ st.markdown("### 📤 Export Reports | رپورٹس ایکسپورٹ کریں")
 def generate_excel():
     output = BytesIO()
     with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        kafla_df.to_excel(writer, index=False, sheet_name='Kafla')
-        zaireen_df.to_excel(writer, index=False, sheet_name='Zaireen')
-        merged_df.to_excel(writer, index=False, sheet_name='Merged')
+        display_frame(kafla_df).to_excel(writer, index=False, sheet_name='Kafla')
+        display_frame(zaireen_df).to_excel(writer, index=False, sheet_name='Zaireen')
+        display_frame(merged_df).to_excel(writer, index=False, sheet_name='Merged')
     output.seek(0)
     return output
 
@@ -120,7 +104,7 @@ def generate_pdf():
 
     # Limit to a subset of fields to avoid PDF overflow
     display_cols = ['Zaireen Name', 'Passport Number', 'Nationality', 'Sex', 'City', 'Province', 'Kafla Name']
-    data = [display_cols] + merged_df[display_cols].fillna("").values.tolist()
+    data = [display_cols] + display_frame(merged_df[display_cols]).values.tolist()
 
     table = Table(data, repeatRows=1)
     table.setStyle(TableStyle([
@@ -135,24 +119,26 @@ def generate_pdf():
     output.seek(0)
     return output
 
-# Download buttons
-excel_file = generate_excel()
-pdf_file = generate_pdf()
-
-st.download_button(
-    label="📥 Download Excel Report",
-    data=excel_file,
-    file_name="Zaireen_Dashboard_Report.xlsx",
-    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-)
+# Download buttons: reports are built on request, once per data version
+col_excel, col_pdf = st.columns(2)
+if col_excel.button("📊 Prepare Excel Report"):
+    col_excel.download_button(
+        label="📥 Download Excel Report",
+        data=data_store.derived(f"report_excel_{season}", lambda: generate_excel().getvalue()),
+        file_name="Zaireen_Dashboard_Report.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    )
 
-st.download_button(
-    label="📄 Download PDF Report",
-    data=pdf_file,
-    file_name="Zaireen_Dashboard_Report.pdf",
-    mime="application/pdf"
-)
+if col_pdf.button("🧾 Prepare PDF Report"):
+    col_pdf.download_button(
+        label="📄 Download PDF Report",
+        data=data_store.derived(f"report_pdf_{season}", lambda: generate_pdf().getvalue()),
+        file_name="Zaireen_Dashboard_Report.pdf",
+        mime="application/pdf"
+    )
 
 # Footer
 st.markdown("---")
 st.markdown("Made with ❤️ for Moakab e Zainabiya")
+
+change_feed.auto_refresh("dashboard")
@@ -0,0 +1,392 @@
+"""Shared, process-wide cache of the Kafla and Zaireen tables.
+
+Streamlit imports this module once per server process, so every browser
+session and every rerun reads the same frames instead of re-parsing the CSVs.
+The cached frames are shared read-only: pages never mutate them and write
+through the ``insert_*`` / ``update_*`` / ``delete_*`` helpers instead.
+
+Every write is recorded in ``change_feed``; its sequence number is the data
+version. A cached frame that is behind the feed replays just the missing
+entries, so a change costs one small delta rather than a full reload.
+
+Writes hold the cross-process ``locking.file_lock`` and replace the CSV
+atomically, so several app replicas can share one data directory.
+
+The feed doubles as a write-ahead journal: a write is fsynced to the feed
+before the CSV is replaced, and ``docs/.applied.json`` records how far each
+CSV has caught up. ``recover`` replays whatever a crash left out, and
+``compact`` snapshots both tables under ``docs/snapshots/<seq>/`` so the
+journal only grows until the next snapshot.
+"""
+import json
+import re
+import shutil
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+import change_feed
+import locking
+import schema
+from schema import BASE_DIR
+
+# Storage paths (relative to the app root, same as the pages use)
+KAFLA_CSV = Path("kafla.csv")
+ZAIREEN_CSV = BASE_DIR / "zaireen.csv"
+APPLIED_FILE = BASE_DIR / ".applied.json"
+SNAPSHOT_DIR = BASE_DIR / "snapshots"
+
+# Snapshot once the current journal segment grows past this
+COMPACT_BYTES = 4 << 20
+KEEP_SNAPSHOTS = 7
+
+# Columns identifying a row in each table
+KEYS = {
+    "kafla": ["Kafla Code"],
+    "zaireen": ["Kafla Code", "Passport Number"],
+}
+
+_lock = threading.RLock()
+_tables = {}
+_derived = {}
+_recovered = False
+
+
+class ConflictError(Exception):
+    """The record changed (or vanished) since the editor loaded it."""
+
+
+def data_version():
+    """Current data version: the latest change-feed sequence number."""
+    return change_feed.latest_seq()
+
+
+def _file_stamp(path):
+    # Catch edits made outside the app (manual CSV fixes, other scripts)
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _read_kafla():
+    return schema.read_csv(KAFLA_CSV, "kafla")
+
+
+def _read_zaireen():
+    return schema.read_csv(ZAIREEN_CSV, "zaireen")
+
+
+_TABLES = {
+    "kafla": (KAFLA_CSV, _read_kafla),
+    "zaireen": (ZAIREEN_CSV, _read_zaireen),
+}
+
+
+def _key_mask(df, table, key):
+    # Key columns are always strings (or categories of strings), see schema.
+    # A partial key (e.g. only the Kafla Code of a Zaireen) matches every row
+    # sharing it.
+    mask = pd.Series(True, index=df.index)
+    for col, value in key.items():
+        mask &= df[col] == str(value)
+    return mask
+
+
+def _apply(df, table, entries):
+    """Replay change-feed entries onto ``df`` (a private copy)."""
+    for entry in entries:
+        mask = _key_mask(df, table, entry["key"])
+        if entry["op"] == "insert":
+            # Inserts are upserts so replaying an entry twice is harmless
+            row = schema.coerce(pd.DataFrame([entry["row"]]), table)
+            df = pd.concat([df[~mask], row], ignore_index=True)
+        elif entry["op"] == "update":
+            changes = schema.coerce(pd.DataFrame([entry["row"]]), table)
+            for col in entry["row"]:
+                col = schema.COLUMN_ALIASES.get(col, col)
+                if col not in df.columns:
+                    df[col] = ""
+                value = changes[col].iloc[0]
+                schema.add_category(df, col, value)
+                df.loc[mask, col] = value
+        elif entry["op"] == "delete":
+            df = df[~mask].reset_index(drop=True)
+    # concat of differing categories falls back to object; restore the dtypes
+    return schema.coerce(df, table)
+
+
+def _load(table):
+    path, read = _TABLES[table]
+    if not _recovered:
+        recover()
+    with _lock:
+        seq = change_feed.latest_seq()
+        hit = _tables.get(table)
+        stamp = _file_stamp(path)
+        if hit is not None and hit[2] == stamp and hit[0] == seq:
+            return hit[1]
+        if hit is not None and hit[0] < seq:
+            entries = change_feed.changes_since(hit[0], table)
+            if entries == [] and hit[2] == stamp:
+                # Only the other table changed; this frame (and its version) stand
+                _tables[table] = (seq, hit[1], stamp, hit[3])
+                return hit[1]
+            if entries is not None:
+                df = _apply(hit[1].copy(), table, entries)
+                touched = entries[-1]["seq"] if entries else seq
+                stamp = _file_stamp(path)
+                _tables[table] = (seq, df, stamp, (touched, stamp))
+                return df
+        # Cold start, outside edit or history no longer retained: full read.
+        # The seq is taken first; replaying anything newer is idempotent.
+        df = read()
+        _tables[table] = (seq, df, stamp, (seq, stamp))
+        return df
+
+
+def table_version(table):
+    """Version of one table: changes only when that table does."""
+    _load(table)
+    with _lock:
+        return _tables[table][3]
+
+
+def derived(name, build, tables=None, extra=None):
+    """Cache ``build()`` under ``name`` until the next data change.
+
+    With ``tables`` (e.g. ``("kafla",)``) only changes to those tables
+    invalidate it, so a Zaireen scan does not rebuild Kafla-only values.
+    ``extra`` is anything else the value depends on (e.g. today's date).
+    """
+    version = data_version() if tables is None else tuple(table_version(t) for t in tables)
+    version = (version, extra)
+    with _lock:
+        hit = _derived.get(name)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    value = build()
+    with _lock:
+        _derived[name] = (version, value)
+    return value
+
+
+def load_kafla():
+    """Shared Kafla frame. Do not mutate it."""
+    return _load("kafla")
+
+
+def load_zaireen():
+    """Shared Zaireen frame. Do not mutate it."""
+    return _load("zaireen")
+
+
+def passport_key(number):
+    """Normalised passport number: upper case, letters and digits only."""
+    return re.sub(r"[^A-Z0-9]", "", str(number).upper())
+
+
+def passport_index():
+    """``{passport_key: [(Kafla Code, Passport Number), ...]}`` per data version."""
+    def build():
+        df = load_zaireen()
+        index = {}
+        for code, passport in zip(df["Kafla Code"].astype(str), df["Passport Number"].astype(str)):
+            index.setdefault(passport_key(passport), []).append((code, passport))
+        return index
+
+    return derived("passport_index", build, tables=("zaireen",))
+
+
+def merged_zaireen():
+    """Zaireen rows joined with their Kafla details, for aggregate views."""
+    def build():
+        return load_zaireen().merge(
+            load_kafla(), on="Kafla Code", how="left", suffixes=("", " (Kafla)")
+        )
+
+    return derived("merged", build)
+
+
+# ---------------- Writes ----------------
+
+def _same(a, b):
+    if pd.isna(a) and pd.isna(b):
+        return True
+    if pd.isna(a) or pd.isna(b):
+        return False
+    return str(a) == str(b)
+
+
+def _check_expected(df, table, key, expected):
+    # Optimistic concurrency: the row must still look the way the editor saw it
+    rows = df[_key_mask(df, table, key)]
+    if rows.empty:
+        raise ConflictError("This record was deleted by someone else.")
+    current = rows.iloc[0]
+    changed = [col for col, value in expected.items() if not _same(current.get(col), value)]
+    if changed:
+        raise ConflictError(f"This record was changed by someone else ({', '.join(changed)}).")
+
+
+def _commit(table, entries, expected=None):
+    """Apply ``entries`` to the table, persist it and record them in the feed."""
+    path, _ = _TABLES[table]
+    with locking.file_lock("data"), _lock:
+        # Under the lock the feed tail includes every other replica's writes
+        current = _load(table)
+        if expected is not None:
+            _check_expected(current, table, entries[0]["key"], expected)
+        df = _apply(current.copy(), table, entries)
+        # Journal first: once it is on disk the write survives a crash
+        seq = change_feed.append_many(table, entries)
+        locking.atomic_write_csv(df, path)
+        _mark_applied({table: seq})
+        stamp = _file_stamp(path)
+        _tables[table] = (seq, df, stamp, (seq, stamp))
+    if change_feed.segment_bytes() > COMPACT_BYTES:
+        compact()
+    return seq
+
+
+# ---------------- Journal recovery and snapshots ----------------
+
+def _applied():
+    try:
+        return json.loads(APPLIED_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _mark_applied(seqs):
+    applied = _applied()
+    applied.update(seqs)
+    locking.atomic_write_bytes(APPLIED_FILE, json.dumps(applied).encode("utf-8"))
+
+
+def recover():
+    """Bring the CSVs up to the journal; return the number of entries replayed.
+
+    Runs once per process before the first read. Without an applied marker
+    (data from before the journal) the CSVs are taken as current, and the
+    first snapshot is taken so the journal has something to replay onto.
+    """
+    global _recovered
+    with locking.file_lock("data"), _lock:
+        latest = change_feed.latest_seq()
+        applied = _applied()
+        replayed = 0
+        for table, (path, read) in _TABLES.items():
+            done = applied.get(table, latest)
+            if done < latest:
+                entries = [e for e in change_feed.read_journal(done) if e["table"] == table]
+                if entries:
+                    locking.atomic_write_csv(_apply(read(), table, entries), path)
+                    replayed += len(entries)
+            applied[table] = latest
+        if applied != _applied():
+            _mark_applied(applied)
+        if not snapshots():
+            _snapshot(latest)
+        _tables.clear()
+        _recovered = True
+        return replayed
+
+
+def snapshots(base=SNAPSHOT_DIR):
+    """Completed snapshots as ``[(seq, ts, folder)]``, oldest first."""
+    found = []
+    for meta in Path(base).glob("*/snapshot.json"):
+        info = json.loads(meta.read_text())
+        found.append((info["seq"], info["ts"], meta.parent))
+    return sorted(found)
+
+
+def _snapshot(seq):
+    # Caller holds the data lock and the CSVs are applied up to ``seq``
+    folder = SNAPSHOT_DIR / f"{seq:012d}"
+    for table, (path, _) in _TABLES.items():
+        if path.exists():
+            locking.atomic_copy(path, folder / f"{table}.csv")
+    meta = {"seq": seq, "ts": datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
+    # Written last: a folder without it is an unfinished snapshot
+    locking.atomic_write_bytes(folder / "snapshot.json", json.dumps(meta).encode("utf-8"))
+    change_feed.rotate()
+
+
+def compact(keep=KEEP_SNAPSHOTS):
+    """Snapshot both tables and start a new journal segment.
+
+    Only the newest ``keep`` snapshots, and the sealed segments after the
+    oldest of them, stay on disk; backups keep the rest.
+    """
+    with locking.file_lock("data"), _lock:
+        recover()
+        seq = change_feed.latest_seq()
+        folder = SNAPSHOT_DIR / f"{seq:012d}"
+        if (folder / "snapshot.json").exists():
+            return None
+        _snapshot(seq)
+
+        kept = snapshots()[-keep:]
+        for old_seq, _, old_folder in snapshots()[:-keep]:
+            shutil.rmtree(old_folder, ignore_errors=True)
+        for segment in change_feed.SEGMENT_DIR.glob("*.jsonl"):
+            if segment.stem.isdigit() and int(segment.stem) < kept[0][0]:
+                segment.unlink()
+    return folder
+
+
+def _entry(table, op, row, key=None):
+    if key is None:
+        key = {col: row[col] for col in KEYS[table]}
+    return {"op": op, "key": key, "row": row}
+
+
+def insert_kafla(row):
+    return _commit("kafla", [_entry("kafla", "insert", row)])
+
+
+def update_kafla(kafla_code, changes, expected=None):
+    """Update a Kafla; ``expected`` holds the values the editor started from."""
+    return _commit("kafla", [_entry("kafla", "update", changes, {"Kafla Code": kafla_code})], expected)
+
+
+def delete_kafla(kafla_code):
+    return _commit("kafla", [_entry("kafla", "delete", None, {"Kafla Code": kafla_code})])
+
+
+def delete_kaflas(kafla_codes):
+    """Delete Kaflas together with all their Zaireen, one write per table."""
+    keys = [{"Kafla Code": code} for code in kafla_codes]
+    _commit("zaireen", [_entry("zaireen", "delete", None, key) for key in keys])
+    return _commit("kafla", [_entry("kafla", "delete", None, key) for key in keys])
+
+
+def insert_zaireen(rows):
+    """Insert one or more Zaireen rows in a single write."""
+    if isinstance(rows, dict):
+        rows = [rows]
+    return _commit("zaireen", [_entry("zaireen", "insert", row) for row in rows])
+
+
+def update_zaireen(kafla_code, passport_number, changes, expected=None):
+    """Update a Zaireen; ``expected`` holds the values the editor started from."""
+    key = {"Kafla Code": kafla_code, "Passport Number": passport_number}
+    return _commit("zaireen", [_entry("zaireen", "update", changes, key)], expected)
+
+
+def update_zaireen_many(updates):
+    """Apply ``[(kafla_code, passport_number, changes)]`` in a single write."""
+    return _commit("zaireen", [
+        _entry("zaireen", "update", changes, {"Kafla Code": code, "Passport Number": passport})
+        for code, passport, changes in updates
+    ])
+
+
+def delete_zaireen(kafla_code, passport_number, expected=None):
+    key = {"Kafla Code": kafla_code, "Passport Number": passport_number}
+    return _commit("zaireen", [_entry("zaireen", "delete", None, key)], expected)
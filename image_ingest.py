@@ -0,0 +1,114 @@
+"""Normalise uploaded document images before they are stored.
+
+Phone photos arrive at 3-8 MB with the rotation only recorded in EXIF.
+``store_document`` applies the EXIF orientation, caps the long side at what
+printing needs and re-encodes as an optimised JPEG, which typically shrinks a
+file several-fold without hurting legibility. PDFs and other files are
+stored unchanged. Set ``ZAIREEN_KEEP_ORIGINALS=1`` to also keep the uploaded
+bytes under a ``.originals`` folder next to the stored file.
+"""
+import io
+import os
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+import locking
+
+# 2000 px covers a passport page at well over 300 dpi and A4 at ~170 dpi
+MAX_SIDE = 2000
+JPEG_QUALITY = 85
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff"}
+KEEP_ORIGINALS = os.environ.get("ZAIREEN_KEEP_ORIGINALS", "") == "1"
+
+
+def normalise_image(data):
+    """Return upright, size-capped JPEG bytes, or None if ``data`` is not an image."""
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except Exception:
+        return None
+
+    changed = image.format != "JPEG" or image.getexif().get(0x0112, 1) != 1
+    image = ImageOps.exif_transpose(image)
+    if max(image.size) > MAX_SIDE:
+        image.thumbnail((MAX_SIDE, MAX_SIDE), Image.LANCZOS)
+        changed = True
+    if image.mode not in ("RGB", "L"):
+        # Flatten transparency onto white rather than black
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+        image = background
+
+    out = io.BytesIO()
+    image.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    encoded = out.getvalue()
+    # An already small, upright JPEG is kept as uploaded
+    if not changed and len(encoded) >= len(data):
+        return data
+    return encoded
+
+
+def _jpg_target(path, stored):
+    # scan.png -> scan.jpg, unless scan.jpg is already a different document
+    target = path.with_suffix(".jpg")
+    if target == path or not target.exists() or target.read_bytes() == stored:
+        return target
+    n = 1
+    while True:
+        candidate = path.with_name(f"{path.stem}-{n}.jpg")
+        if not candidate.exists() or candidate.read_bytes() == stored:
+            return candidate
+        n += 1
+
+
+def store_document(data, path, keep_original=None):
+    """Store an uploaded document at ``path`` and return the path written.
+
+    Images are normalised and always stored as ``.jpg``; anything else is
+    written byte-for-byte. Converting a non-JPEG never replaces a different
+    document of the same name: ``scan.png`` goes to ``scan-1.jpg`` when
+    ``scan.jpg`` is already taken.
+    """
+    path = Path(path)
+    if keep_original is None:
+        keep_original = KEEP_ORIGINALS
+
+    stored = None
+    if path.suffix.lower() in IMAGE_SUFFIXES:
+        stored = normalise_image(data)
+    if stored is None:
+        locking.atomic_write_bytes(path, data)
+        return path
+
+    target = _jpg_target(path, stored)
+    locking.atomic_write_bytes(target, stored)
+    if keep_original and stored is not data:
+        locking.atomic_write_bytes(path.parent / ".originals" / path.name, data)
+    return target
+
+
+def normalise_tree(root, keep_original=None):
+    """Re-ingest images already stored under ``root``; return (files, bytes saved)."""
+    count = saved = 0
+    for path in sorted(Path(root).rglob("*")):
+        if not path.is_file() or path.suffix.lower() not in IMAGE_SUFFIXES:
+            continue
+        if any(part.startswith(".") for part in path.relative_to(root).parts):
+            continue
+        data = path.read_bytes()
+        target = store_document(data, path, keep_original)
+        if target != path:
+            path.unlink()
+        count += 1
+        saved += len(data) - target.stat().st_size
+    return count, saved
+
+
+if __name__ == "__main__":
+    import sys
+
+    root = sys.argv[1] if len(sys.argv) > 1 else "docs"
+    files, saved = normalise_tree(root)
+    print(f"{files} image(s) normalised under {root}, {saved / 1e6:.1f} MB saved")
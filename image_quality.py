@@ -0,0 +1,102 @@
+"""Cheap pre-OCR quality gate for passport captures.
+
+``read_mrz`` takes a second or more per image and simply fails on blurry,
+washed-out or sideways frames. ``check_frame`` looks at a downscaled
+greyscale copy (a few milliseconds) and either rejects the frame with a
+reason the volunteer can act on, or tells the caller how to rotate it so the
+MRZ ends up at the bottom.
+"""
+import cv2
+import numpy as np
+
+# Long side of the working copy; thresholds below are tuned for this size
+WORK_SIZE = 800
+BLUR_MIN_VARIANCE = 50.0   # variance of the Laplacian
+DARK_MAX_MEAN = 50         # mean grey level
+GLARE_MAX_FRACTION = 0.25  # share of near-white (>= 250) pixels
+MRZ_MIN_ASPECT = 8         # MRZ lines are long and thin...
+MRZ_MIN_WIDTH = 0.5        # ...and span at least half the page
+
+_ROTATE = {90: cv2.ROTATE_90_CLOCKWISE, 180: cv2.ROTATE_180, 270: cv2.ROTATE_90_COUNTERCLOCKWISE}
+_LINE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (25, 5))
+_CLOSE_KERNEL = cv2.getStructuringElement(cv2.MORPH_RECT, (11, 11))
+
+
+def _working_copy(image):
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    h, w = gray.shape
+    scale = WORK_SIZE / max(h, w)
+    return cv2.resize(gray, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+
+
+def mrz_bands(gray):
+    """Bounding boxes of dark, wide, text-like lines (MRZ candidates)."""
+    h, w = gray.shape
+    blackhat = cv2.morphologyEx(cv2.GaussianBlur(gray, (3, 3), 0), cv2.MORPH_BLACKHAT, _LINE_KERNEL)
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype("uint8")
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, _LINE_KERNEL)
+    _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, _CLOSE_KERNEL)
+    thresh = cv2.erode(thresh, None, iterations=1)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    bands = []
+    for contour in contours:
+        x, y, bw, bh = cv2.boundingRect(contour)
+        if bh and bw / bh >= MRZ_MIN_ASPECT and bw >= MRZ_MIN_WIDTH * w:
+            bands.append((x, y, bw, bh))
+    return bands
+
+
+def _mrz_rotation(gray):
+    # Try upright and sideways; the MRZ sits in the bottom half when upright
+    for base in (0, 90):
+        view = gray if base == 0 else cv2.rotate(gray, _ROTATE[90])
+        bands = mrz_bands(view)
+        if bands:
+            centre = np.mean([y + bh / 2 for _, y, _, bh in bands]) / view.shape[0]
+            return base if centre >= 0.5 else base + 180
+    return None
+
+
+def check_frame(data):
+    """Assess encoded image bytes before running OCR.
+
+    Returns a dict with ``ok``, ``reason`` (empty when ok), ``rotation``
+    (clockwise degrees that put the MRZ at the bottom), the measured
+    ``metrics`` and, when a rotation is needed, the corrected JPEG bytes
+    under ``data``.
+    """
+    result = {"ok": False, "reason": "", "rotation": 0, "metrics": {}, "data": data}
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    if image is None:
+        result["reason"] = "Not a readable image."
+        return result
+
+    gray = _working_copy(image)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    hist = cv2.calcHist([gray], [0], None, [256], [0, 256]).ravel() / gray.size
+    metrics = result["metrics"] = {
+        "sharpness": round(float(sharpness), 1),
+        "brightness": round(float(gray.mean()), 1),
+        "glare": round(float(hist[250:].sum()), 3),
+    }
+
+    if metrics["sharpness"] < BLUR_MIN_VARIANCE:
+        result["reason"] = "Image is blurry. Hold the passport still and let the camera focus."
+    elif metrics["brightness"] < DARK_MAX_MEAN:
+        result["reason"] = "Image is too dark. Move to better light."
+    elif metrics["glare"] > GLARE_MAX_FRACTION:
+        result["reason"] = "Too much glare. Tilt the passport away from the light."
+    else:
+        rotation = _mrz_rotation(gray)
+        if rotation is None:
+            result["reason"] = "No MRZ found. Keep the two lines at the bottom of the photo page in frame."
+        else:
+            result["ok"] = True
+            result["rotation"] = rotation
+            if rotation:
+                ok, buf = cv2.imencode(".jpg", cv2.rotate(image, _ROTATE[rotation]),
+                                       [cv2.IMWRITE_JPEG_QUALITY, 95])
+                result["data"] = buf.tobytes()
+    return result
@@ -0,0 +1,102 @@
+"""Kafla lookups by code and by label prefix, and the searchable Kafla picker.
+
+Pages used to build every "Kafla Name (Salar Name)" label up front, hand all
+of them to a selectbox and then find the picked Kafla with a
+``kafla_df[kafla_df["Kafla Code"] == code]`` scan. The directory is built
+once per data version instead: a dict from code to row, and a sorted list
+of search keys (every word of the label onwards, and the code) that a prefix
+query bisects into. ``select_kafla`` shows a search box and a selectbox of
+at most ``SEARCH_LIMIT`` matches, so a page renders and resolves its Kafla in
+O(log n) however many are registered. Only Kafla writes rebuild it; Zaireen
+scans and edits leave it in place.
+"""
+from bisect import bisect_left
+
+import streamlit as st
+
+import data_store
+
+# Options shown in the picker at a time; the search box narrows the rest
+SEARCH_LIMIT = 50
+
+
+class KaflaDirectory:
+    """Kafla records by code, with labels searchable by prefix."""
+
+    def __init__(self, df):
+        # Row positions only; a record is taken from the frame when it is asked for
+        self.df = df
+        codes = df["Kafla Code"].astype(str).tolist()
+        self.rows = {code: i for i, code in enumerate(codes)}
+        labels = df["Kafla Name"].astype(str) + " (" + df["Salar Name"].astype(str) + ")"
+        self.labels = dict(zip(codes, labels))
+        # Codes in label order, for an empty query and the status tables
+        self.ordered = sorted(self.labels, key=lambda code: (self.labels[code].casefold(), code))
+        keys = []
+        for code, label in self.labels.items():
+            words = label.casefold().split()
+            keys += [(" ".join(words[i:]).lstrip("("), code) for i in range(len(words))]
+            keys.append((code.casefold(), code))
+        keys.sort()
+        self.keys = keys
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, code):
+        return code in self.rows
+
+    def get(self, code):
+        """Row of ``code`` in the Kafla frame, or None."""
+        i = self.rows.get(code)
+        return None if i is None else self.df.iloc[i]
+
+    def label(self, code, with_code=False):
+        label = self.labels[code]
+        return f"{label} - {code}" if with_code else label
+
+    def search(self, query, limit=SEARCH_LIMIT):
+        """Codes of up to ``limit`` Kaflas whose label has a word starting with ``query``."""
+        prefix = " ".join(query.casefold().split()).lstrip("(")
+        if not prefix:
+            return self.ordered[:limit]
+        found = {}
+        i = bisect_left(self.keys, (prefix,))
+        while i < len(self.keys) and len(found) < limit:
+            key, code = self.keys[i]
+            if not key.startswith(prefix):
+                break
+            found[code] = None
+            i += 1
+        return sorted(found, key=lambda code: (self.labels[code].casefold(), code))
+
+
+def directory():
+    """The current ``KaflaDirectory``, rebuilt when the data changes."""
+    return data_store.derived("kafla_directory", lambda: KaflaDirectory(data_store.load_kafla()), tables=("kafla",))
+
+
+def select_kafla(label, key, with_code=False):
+    """Searchable Kafla picker; returns the selected Kafla Code, or None if there are none.
+
+    The selection is kept in ``st.session_state[key]`` so it survives the
+    options changing while the volunteer types.
+    """
+    kaflas = directory()
+    query = st.text_input("🔍 Search Kafla (name, Salar or code)", key=f"{key}_search")
+    options = kaflas.search(query)
+    current = st.session_state.get(key)
+    if current in kaflas and current not in options:
+        options = [current] + options
+    if not options:
+        st.caption("No Kafla matches this search." if query.strip() else "No Kaflas registered yet.")
+        return current if current in kaflas else None
+    if len(options) >= SEARCH_LIMIT:
+        st.caption(f"Showing {len(options)} of {len(kaflas):,} Kaflas; type to narrow the list.")
+    code = st.selectbox(
+        label, options,
+        index=options.index(current) if current in options else 0,
+        format_func=lambda c: kaflas.label(c, with_code),
+    )
+    st.session_state[key] = code
+    return code
@@ -1,11 +1,11 @@
 import streamlit as st
-import pandas as pd
-import os
 import uuid
 from datetime import datetime
 from pathlib import Path
-from PIL import Image
-import shutil
+import data_store
+from schema import fmt_date
+import locking
+from image_ingest import store_document
 
 st.title("🕌 Kafla Registration Form | قافلہ رجسٹریشن")
 
@@ -23,18 +23,10 @@ st.markdown("""
 # Define storage path
 DATA_DIR = Path("docs")
 DATA_DIR.mkdir(exist_ok=True)
-CSV_FILE = Path("kafla.csv")
+CSV_FILE = data_store.KAFLA_CSV
 
-# Load or initialize DataFrame
-if CSV_FILE.exists():
-    df = pd.read_csv(CSV_FILE)
-    if "Created At" not in df.columns:
-        df["Created At"] = ""
-else:
-    df = pd.DataFrame(columns=[
-        "Kafla Code", "Kafla Name", "City", "Province", "Country",
-        "Salar Name", "Salar CNIC", "Salar Contact", "Created At"
-    ])
+# Load shared DataFrame (read-only; writes build a new frame and save it)
+df = data_store.load_kafla()
 
 st.markdown("---")
 st.markdown("### 📝 Enter Kafla Details")
@@ -50,6 +42,8 @@ with st.form("kafla_form", clear_on_submit=True):
     salar_name = st.text_input("Salar Name | سالار کا نام", placeholder="e.g. Syed Ali Raza")
     salar_cnic = st.text_input("Salar CNIC (13 digits) | سالار کا شناختی کارڈ نمبر", max_chars=13, placeholder="e.g. 4210112345678")
     salar_contact = st.text_input("Salar Contact | سالار سے رابطہ", max_chars=11, placeholder="e.g. 03001234567")
+    # No default: a defaulted "today" would hide a missing departure date
+    departure_date = st.date_input("Departure Date | روانگی کی تاریخ", value=None, min_value=datetime.now().date())
 
     # File upload sections
     with st.expander("📁 Registration Documents | رجسٹریشن کے دستاویزات"):
@@ -71,6 +65,8 @@ with st.form("kafla_form", clear_on_submit=True):
 if submitted:
     if not all([kafla_name, city, province, country, salar_name, salar_cnic, salar_contact]):
         st.error("❌ Please fill all required fields")
+    elif departure_date is None:
+        st.error("❌ Please choose the departure date")
     elif not salar_cnic.isdigit() or len(salar_cnic) != 13 or not salar_contact.isdigit() or len(salar_contact) != 11:
         st.error("❌ Please check CNIC and Contact format")
     elif any(char.isdigit() for char in salar_name):
@@ -86,10 +82,11 @@ if submitted:
             "Salar Name": salar_name,
             "Salar CNIC": salar_cnic,
             "Salar Contact": salar_contact,
+            "Departure Date": departure_date.strftime("%Y-%m-%d"),
+            "Season": str(departure_date.year),
             "Created At": now
         }
-        df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
-        df.to_csv(CSV_FILE, index=False)
+        data_store.insert_kafla(row)
 
         kafla_dir = DATA_DIR / str(kafla_code)
         (kafla_dir / "registration").mkdir(parents=True, exist_ok=True)
@@ -99,9 +96,7 @@ if submitted:
 
         def save_files(file_list, subfolder):
             for file in file_list:
-                file_path = kafla_dir / subfolder / file.name
-                with open(file_path, "wb") as f:
-                    f.write(file.read())
+                store_document(file.read(), kafla_dir / subfolder / file.name)
 
         save_files(reg_files, "registration")
         save_files(vehicle_files, "vehicle")
@@ -132,15 +127,15 @@ if not df.empty:
             **Salar:** {row['Salar Name']} | CNIC: {row['Salar CNIC']}  
             **City/Province/Country:** {row['City']}, {row['Province']}, {row['Country']}  
             **Contact:** {row['Salar Contact']}  
+            **Departure:** {fmt_date(row['Departure Date'])}  
             **Created:** {row.get('Created At', '')}
             """)
         with cols[1]:
             if st.button("🗑️ Delete", key=f"delete_{row['Kafla Code']}"):
-                df = df[df["Kafla Code"] != row["Kafla Code"]]
-                df.to_csv(CSV_FILE, index=False)
-                folder_to_remove = DATA_DIR / str(row["Kafla Code"])
-                if folder_to_remove.exists():
-                    shutil.rmtree(folder_to_remove)
+                # Its Zaireen and convoy documents go with it
+                data_store.delete_kaflas([row["Kafla Code"]])
+                locking.remove_tree(DATA_DIR / str(row["Kafla Code"]))
+                locking.remove_tree(DATA_DIR / "convoy_docs" / str(row["Kafla Code"]))
                 st.success(f"🗑️ Kafla '{row['Kafla Name']}' deleted.")
                 st.rerun()
 
@@ -0,0 +1,571 @@
+"""Load test: simulated volunteers against a locally started portal.
+
+Starts ``streamlit run Home.py`` on a throwaway copy of the app with a seeded
+season, then drives N concurrent browser sessions over Streamlit's websocket
+protocol, the same messages the frontend sends. Each session registers its
+own Kafla and then, with a think time between actions, picks pages from the
+option menu: uploads sample passports to Zaireen Entry and scans them, edits
+Zaireen in the Admin Panel and prepares and downloads the Dashboard reports::
+
+    python loadtest.py --sessions 20 --duration 120
+    python loadtest.py --sessions 50 --rows 20000 --samples samples/passports
+
+Per-action latency percentiles and error rates are printed at the end,
+followed by a write audit against the data the server left behind:
+acknowledged registrations, scans and edits that are missing (lost writes),
+edits rejected as conflicts that were written anyway, and gaps in the change
+feed. The exit status is non-zero when any write was lost.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+import uuid
+from collections import Counter, defaultdict
+from datetime import date, timedelta
+from pathlib import Path
+
+from streamlit.proto.Alert_pb2 import Alert
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.Common_pb2 import FileUploaderState, StringArray, UploadedFileInfo
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from tornado.httpclient import AsyncHTTPClient, HTTPRequest
+from tornado.websocket import websocket_connect
+
+APP_FILES = ["*.py", "*.jpg", ".streamlit/config.toml"]
+PAGES = ["Kafla Registration", "Zaireen Entry", "Convoy Documents", "Admin Panel", "Dashboard"]
+# How often a session picks each flow after registering its Kafla
+FLOWS = {"scan": 3, "edit": 3, "report": 1, "browse": 1}
+CITIES = [("Karachi", "Sindh"), ("Lahore", "Punjab"), ("Quetta", "Balochistan"), ("Peshawar", "KPK")]
+SALAR = "Load Salar"
+# Admin edits go to the first rows of the first --hot Kaflas
+HOT_ROWS = 5
+
+
+class PageError(Exception):
+    """The script run showed an exception, or the app did not answer."""
+
+
+# ---------------- One browser session ----------------
+
+def click(button):
+    return WidgetState(id=button.id, trigger_value=True)
+
+
+def text(widget, value):
+    return WidgetState(id=widget.id, string_value=value)
+
+
+def choose(selectbox, index):
+    return WidgetState(id=selectbox.id, int_value=index)
+
+
+def pick_date(date_input, day):
+    return WidgetState(id=date_input.id, string_array_value=StringArray(data=[day.strftime("%Y/%m/%d")]))
+
+
+class Session:
+    """One browser tab: a websocket plus the widget values the frontend keeps.
+
+    Like the frontend, every rerun sends the current value of every widget
+    on the page; button triggers are sent once.
+    """
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.ws = None
+        self.session_id = None
+        self.page_hash = ""
+        self.widgets = {}
+        self.elements = []
+        self.toasts = []
+        self._cache = {}
+
+    @property
+    def connected(self):
+        return self.ws is not None
+
+    async def connect(self):
+        url = "ws" + self.base_url[len("http"):] + "/_stcore/stream"
+        self.ws = await websocket_connect(url, max_message_size=512 << 20)
+        await self.run()
+
+    def close(self):
+        if self.ws is not None:
+            self.ws.close()
+            self.ws = None
+
+    async def _send(self, msg):
+        await self.ws.write_message(msg.SerializeToString(), binary=True)
+
+    async def _receive(self):
+        try:
+            data = await asyncio.wait_for(self.ws.read_message(), self.timeout)
+        except asyncio.TimeoutError:
+            self.close()
+            raise PageError(f"no answer within {self.timeout:g}s")
+        if data is None:
+            self.close()
+            raise PageError("websocket closed")
+        msg = ForwardMsg()
+        msg.ParseFromString(data)
+        # Large cacheable messages are sent once, then referenced by hash
+        if msg.WhichOneof("type") == "ref_hash":
+            cached = ForwardMsg()
+            cached.CopyFrom(self._cache[msg.ref_hash])
+            cached.metadata.CopyFrom(msg.metadata)
+            msg = cached
+        elif msg.metadata.cacheable:
+            self._cache[msg.hash] = msg
+        return msg
+
+    async def run(self, *changes):
+        """Rerun the script with ``changes`` applied, like one user interaction."""
+        for state in changes:
+            self.widgets[state.id] = state
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = self.page_hash
+        msg.rerun_script.widget_states.widgets.extend(self.widgets.values())
+        await self._send(msg)
+        self.widgets = {k: v for k, v in self.widgets.items() if not v.trigger_value}
+
+        elements, self.toasts = {}, []
+        while True:
+            msg = await self._receive()
+            kind = msg.WhichOneof("type")
+            if kind == "new_session":
+                # A new script run; st.rerun() starts another one
+                if msg.new_session.HasField("initialize"):
+                    self.session_id = msg.new_session.initialize.session_id
+                self.page_hash = msg.new_session.page_script_hash
+                elements = {}
+            elif kind == "delta" and msg.delta.WhichOneof("type") == "new_element":
+                element = msg.delta.new_element
+                elements[tuple(msg.metadata.delta_path)] = element
+                if element.WhichOneof("type") == "toast":
+                    self.toasts.append(element.toast.body)
+            elif kind == "script_finished" and msg.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        self.elements = [elements[path] for path in sorted(elements)]
+
+        # Widgets no longer on the page are forgotten, as in the browser
+        shown = {w.id for w in self._payloads() if "id" in w.DESCRIPTOR.fields_by_name}
+        self.widgets = {k: v for k, v in self.widgets.items() if k in shown}
+        errors = [e.exception for e in self.elements if e.WhichOneof("type") == "exception"]
+        if errors:
+            raise PageError(f"{errors[0].type}: {errors[0].message}"[:120])
+
+    def _payloads(self, kind=None):
+        for element in self.elements:
+            if kind is None or element.WhichOneof("type") == kind:
+                yield getattr(element, element.WhichOneof("type"))
+
+    def find_all(self, kind, label):
+        """Elements of ``kind`` whose label contains ``label``, in page order."""
+        return [w for w in self._payloads(kind) if label in w.label]
+
+    def find(self, kind, label):
+        found = self.find_all(kind, label)
+        if not found:
+            raise PageError(f"no {kind} {label!r} on the page")
+        return found[0]
+
+    def alerts(self, fmt):
+        return [a.body for a in self._payloads("alert") if a.format == fmt]
+
+    def markdown(self):
+        return "\n".join(m.body for m in self._payloads("markdown"))
+
+    async def open(self, page):
+        """Pick ``page`` in the option menu."""
+        menu = next((c for c in self._payloads("component_instance") if "option_menu" in c.component_name), None)
+        if menu is None:
+            raise PageError("option menu not shown")
+        await self.run(WidgetState(id=menu.id, json_value=json.dumps(page)))
+
+    async def upload(self, uploader, files):
+        """Drop ``[(name, bytes)]`` on a file uploader; returns its new state."""
+        msg = BackMsg()
+        request = msg.file_urls_request
+        request.request_id = uuid.uuid4().hex
+        request.session_id = self.session_id
+        request.file_names.extend(name for name, _ in files)
+        await self._send(msg)
+        while True:
+            reply = await self._receive()
+            if reply.WhichOneof("type") == "file_urls_response" and \
+                    reply.file_urls_response.response_id == request.request_id:
+                break
+        if reply.file_urls_response.error_msg:
+            raise PageError(reply.file_urls_response.error_msg)
+
+        state = FileUploaderState()
+        for (name, data), urls in zip(files, reply.file_urls_response.file_urls):
+            boundary = uuid.uuid4().hex
+            body = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+                    f"Content-Type: image/jpeg\r\n\r\n").encode() + data + f"\r\n--{boundary}--\r\n".encode()
+            await self.fetch(urls.upload_url, method="PUT", body=body,
+                             headers={"Content-Type": f"multipart/form-data; boundary={boundary}"})
+            state.uploaded_file_info.append(
+                UploadedFileInfo(file_id=urls.file_id, name=name, size=len(data), file_urls=urls))
+        return WidgetState(id=uploader.id, file_uploader_state_value=state)
+
+    async def fetch(self, url, **kwargs):
+        url = url if url.startswith("http") else self.base_url + "/" + url.lstrip("/")
+        response = await AsyncHTTPClient().fetch(HTTPRequest(url, request_timeout=self.timeout, **kwargs))
+        return response.body
+
+
+# ---------------- Volunteer flows ----------------
+
+class Recorder:
+    """Latency and failures of every action, by action name."""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.errors = defaultdict(Counter)
+
+    async def timed(self, action, step):
+        start = time.perf_counter()
+        try:
+            return await step
+        except Exception as e:
+            self.errors[action][str(e) or type(e).__name__] += 1
+            raise
+        finally:
+            self.latency[action].append(time.perf_counter() - start)
+
+    def failures(self, action):
+        return sum(self.errors[action].values())
+
+
+class Volunteer:
+    def __init__(self, number, base_url, args, samples, recorder, writes):
+        self.number = number
+        self.args = args
+        self.samples = samples
+        self.recorder = recorder
+        self.writes = writes
+        self.rng = random.Random(number)
+        self.session = Session(base_url, args.timeout)
+        self.kafla_name = f"Load Kafla {number}"
+        self.registered = False
+        self.edits = 0
+
+    async def step(self, action, coro):
+        return await self.recorder.timed(action, coro)
+
+    async def open(self, page):
+        await self.step(f"open {page}", self.session.open(page))
+
+    async def register(self):
+        s = self.session
+        await self.open("Kafla Registration")
+        city, province = CITIES[self.number % len(CITIES)]
+        values = {"Kafla Name": self.kafla_name, "City": city, "Province": province, "Country": "Pakistan",
+                  "Salar Name": SALAR, "Salar CNIC": f"42101{self.number:08d}",
+                  "Salar Contact": f"03{self.number:09d}"}
+        changes = [text(s.find("text_input", label), value) for label, value in values.items()]
+        changes.append(pick_date(s.find("date_input", "Departure Date"), date.today() + timedelta(days=30)))
+        await self.step("register", s.run(*changes, click(s.find("button", "Save Kafla"))))
+        if f"**Name:** {self.kafla_name}" not in s.markdown():
+            raise PageError("registered Kafla not listed")
+        self.writes["kafla"].append(self.kafla_name)
+        self.registered = True
+
+    async def scan(self):
+        s = self.session
+        await self.open("Zaireen Entry")
+        # The picker lists a page of Kaflas; search narrows it to ours
+        await self.step("search kafla", s.run(text(s.find("text_input", "Search Kafla"), self.kafla_name)))
+        box = s.find("selectbox", "Select Kafla")
+        label = f"{self.kafla_name} ({SALAR})"
+        await self.step("select kafla", s.run(choose(box, list(box.options).index(label))))
+
+        picked = self.rng.sample(self.samples, min(self.args.per_scan, len(self.samples)))
+        files = [(f"s{self.number}-{uuid.uuid4().hex[:6]}-{name}", data) for name, data in picked]
+        uploader = s.find("file_uploader", "Upload JPG")
+        state = await self.step("upload", s.upload(uploader, files))
+        await self.step("upload", s.run(state))
+        # Scan, and clear the uploader as a volunteer would before the next batch
+        cleared = WidgetState(id=uploader.id, file_uploader_state_value=FileUploaderState())
+        await self.step("scan", s.run(cleared, click(s.find("button", "Scan Uploaded Files"))))
+        for body in s.alerts(Alert.SUCCESS):
+            match = re.match(r"✅ (\d+) added", body)
+            if match:
+                self.writes["added"][self.kafla_name] += int(match.group(1))
+        for button in s.find_all("download_button", "Download PDF"):
+            await self.step("download list", s.fetch(button.url))
+
+    async def edit(self):
+        s = self.session
+        await self.open("Admin Panel")
+        box = s.find("selectbox", "Select Kafla")
+        # Edits concentrate on a few rows, so volunteers collide
+        index = self.rng.randrange(min(self.args.hot, len(box.options)))
+        await self.step("select kafla", s.run(choose(box, index)))
+        # A Kafla registered meanwhile changes the options, and with them the
+        # widget, which then falls back to its default
+        shown = s.find("selectbox", "Select Kafla")
+        code = shown.options[index if shown.id == box.id else shown.default].rsplit(" - ", 1)[-1]
+        names = s.find_all("text_input", "Full Name")
+        if not names:
+            return
+        passports = s.find_all("text_input", "Passport Number")
+        saves = [b for b in s.find_all("button", "Save") if b.label == "💾 Save"]
+        row = self.rng.randrange(min(HOT_ROWS, len(names)))
+        self.edits += 1
+        value = f"LOAD {self.number} EDIT {self.edits}"
+        key = (code, passports[row].default)
+
+        start = time.monotonic()
+        await self.step("edit", s.run(text(names[row], value), click(saves[row])))
+        # The toast can be lost to the page's st.rerun(); after a conflict the
+        # page shows the latest values instead of ours
+        shown = {p.default: n.default for p, n in zip(s.find_all("text_input", "Passport Number"),
+                                                      s.find_all("text_input", "Full Name"))}
+        saved = any(t.startswith("✅") for t in s.toasts) or shown.get(key[1]) == value
+        self.writes["edits"].append({"key": key, "value": value, "saved": saved,
+                                     "start": start, "end": time.monotonic()})
+
+    async def report(self):
+        s = self.session
+        await self.open("Dashboard")
+        await self.step("prepare report", s.run(click(s.find("button", "Prepare Excel Report"))))
+        await self.step("download report", s.fetch(s.find("download_button", "Download Excel Report").url))
+
+    async def browse(self):
+        await self.open(self.rng.choice(PAGES))
+
+    async def run(self, deadline):
+        flows = list(FLOWS)
+        weights = list(FLOWS.values())
+        while time.monotonic() < deadline:
+            try:
+                if not self.session.connected:
+                    await self.step("connect", self.session.connect())
+                if not self.registered:
+                    await self.register()
+                else:
+                    await getattr(self, self.rng.choices(flows, weights)[0])()
+            except Exception:
+                # Already recorded; a dropped connection reconnects next time
+                pass
+            await asyncio.sleep(self.rng.uniform(*self.args.think))
+        self.session.close()
+
+
+async def run_sessions(base_url, args, samples):
+    AsyncHTTPClient.configure(None, max_clients=max(10, args.sessions * 2))
+    recorder = Recorder()
+    writes = {"kafla": [], "added": Counter(), "edits": []}
+    deadline = time.monotonic() + args.duration
+
+    async def start(volunteer):
+        # Volunteers arrive over the ramp-up period
+        await asyncio.sleep(args.ramp * volunteer.number / args.sessions)
+        await volunteer.run(deadline)
+
+    volunteers = [Volunteer(n, base_url, args, samples, recorder, writes) for n in range(args.sessions)]
+    await asyncio.gather(*(start(v) for v in volunteers))
+    return recorder, writes
+
+
+# ---------------- App under test ----------------
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def prepare_app(workdir, args):
+    """Copy the app into ``workdir`` and seed it with a synthetic season."""
+    root = Path(__file__).resolve().parent
+    for pattern in APP_FILES:
+        for path in root.glob(pattern):
+            (workdir / path.relative_to(root)).parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(path, workdir / path.relative_to(root))
+
+    import data_store
+    import locking
+    import seasons
+    from benchmarks import synthetic_tables
+
+    kafla, zaireen = synthetic_tables(args.rows, per_kafla=max(1, args.rows // args.kaflas))
+    kafla["Season"] = seasons.CURRENT_SEASON
+    locking.atomic_write_csv(kafla, data_store.KAFLA_CSV)
+    locking.atomic_write_csv(zaireen, data_store.ZAIREEN_CSV)
+
+
+def start_server(workdir, port, log):
+    cmd = [sys.executable, "-m", "streamlit", "run", "Home.py",
+           "--server.headless", "true", "--server.address", "127.0.0.1", "--server.port", str(port),
+           "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false",
+           # Uploads come from this script, not from a page carrying the XSRF cookie
+           "--server.enableXsrfProtection", "false"]
+    proc = subprocess.Popen(cmd, cwd=workdir, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"Server exited with status {proc.returncode}; see {log.name}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=2):
+                return proc
+        except OSError:
+            time.sleep(0.5)
+    proc.kill()
+    raise SystemExit(f"Server did not come up within 60s; see {log.name}")
+
+
+def _peak_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+
+
+def _samples(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(p for p in path.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        elif path.exists():
+            files.append(path)
+    return [(p.name, p.read_bytes()) for p in files]
+
+
+# ---------------- Results ----------------
+
+def audit(writes):
+    """Compare what the sessions were told was saved with what was saved."""
+    import change_feed
+    import data_store
+
+    kafla = data_store.load_kafla()
+    zaireen = data_store.load_zaireen()
+    codes = dict(zip(kafla["Kafla Name"], kafla["Kafla Code"]))
+    rows = zaireen.groupby("Kafla Code").size()
+    final = dict(zip(zip(zaireen["Kafla Code"], zaireen["Passport Number"]), zaireen["Zaireen Name"]))
+
+    result = {
+        "kaflas": len(writes["kafla"]),
+        "lost kaflas": sum(name not in codes for name in writes["kafla"]),
+        "added": sum(writes["added"].values()),
+        "lost rows": sum(max(0, added - int(rows.get(codes.get(name), 0)))
+                         for name, added in writes["added"].items()),
+        "edits": sum(e["saved"] for e in writes["edits"]),
+        "conflicts": sum(not e["saved"] for e in writes["edits"]),
+        "lost edits": 0,
+        "rejected but written": 0,
+    }
+    by_key = defaultdict(list)
+    for edit in writes["edits"]:
+        by_key[edit["key"]].append(edit)
+    for key, edits in by_key.items():
+        value = final.get(key)
+        if value in {e["value"] for e in edits if not e["saved"]}:
+            result["rejected but written"] += 1
+        saved = sorted((e for e in edits if e["saved"]), key=lambda e: e["end"])
+        # The last save must win, unless another save overlapped it
+        if saved and not any(e["end"] > saved[-1]["start"] for e in saved[:-1]) and value != saved[-1]["value"]:
+            result["lost edits"] += 1
+
+    seqs = [e["seq"] for e in change_feed.read_journal()]
+    result["changes"] = len(seqs)
+    result["feed gaps"] = seqs[-1] - seqs[0] + 1 - len(seqs) if seqs else 0
+    return result
+
+
+def print_report(recorder, result, elapsed, sessions):
+    import numpy as np
+
+    print(f"\n{sessions} session(s), {elapsed:.0f}s")
+    print(f"{'action':28} {'count':>6} {'errors':>7} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7}")
+    for action in sorted(recorder.latency):
+        times = np.array(recorder.latency[action])
+        p50, p95, p99 = np.percentile(times, [50, 95, 99])
+        errors = recorder.failures(action) / len(times)
+        print(f"{action:28} {len(times):6d} {errors:7.1%} {p50:6.2f}s {p95:6.2f}s {p99:6.2f}s {times.max():6.2f}s")
+
+    errors = Counter()
+    for action, counts in recorder.errors.items():
+        errors.update({f"{action}: {message}": n for message, n in counts.items()})
+    for message, n in errors.most_common(10):
+        print(f"  {n:5d} x {message}")
+
+    print(f"\nKaflas registered {result['kaflas']}, lost {result['lost kaflas']}")
+    print(f"Passports added {result['added']}, lost {result['lost rows']}")
+    print(f"Edits saved {result['edits']}, conflicts {result['conflicts']}, lost {result['lost edits']}, "
+          f"rejected but written {result['rejected but written']}")
+    print(f"Change feed: {result['changes']} entries, {result['feed gaps']} gap(s)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent volunteer sessions against a local portal")
+    parser.add_argument("--sessions", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=60, help="seconds of load after ramp-up starts")
+    parser.add_argument("--ramp", type=float, default=10, help="seconds over which sessions arrive")
+    parser.add_argument("--think", type=float, nargs=2, default=[1.0, 4.0], metavar=("MIN", "MAX"),
+                        help="pause between actions, in seconds")
+    parser.add_argument("--rows", type=int, default=2000, help="Zaireen in the seeded season")
+    parser.add_argument("--kaflas", type=int, default=40, help="Kaflas in the seeded season")
+    parser.add_argument("--hot", type=int, default=5, help="Kaflas the Admin edits go to")
+    parser.add_argument("--samples", nargs="+", default=["temp_passport.jpg"], help="passport images (files or folders)")
+    parser.add_argument("--per-scan", type=int, default=2, help="passports uploaded per scan")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds before a script run counts as failed")
+    parser.add_argument("--keep", action="store_true", help="keep the working copy and server log")
+    args = parser.parse_args(argv)
+
+    samples = _samples(args.samples)
+    if not samples:
+        raise SystemExit("No sample passports found")
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    workdir = Path(tempfile.mkdtemp(prefix="zaireen-load-"))
+    os.chdir(workdir)
+    prepare_app(workdir, args)
+
+    port = _free_port()
+    with open(workdir / "server.log", "wb") as log:
+        proc = start_server(workdir, port, log)
+        print(f"Portal on http://127.0.0.1:{port} (pid {proc.pid}, {workdir})")
+        start = time.perf_counter()
+        try:
+            recorder, writes = asyncio.run(run_sessions(f"http://127.0.0.1:{port}", args, samples))
+        finally:
+            peak = _peak_rss(proc.pid)
+            proc.terminate()
+            proc.wait(30)
+        elapsed = time.perf_counter() - start
+
+    result = audit(writes)
+    print_report(recorder, result, elapsed, args.sessions)
+    tracebacks = (workdir / "server.log").read_text(errors="replace").count("Traceback")
+    print(f"Server: peak RSS {peak / 1e6:.0f} MB, {tracebacks} traceback(s) in the log" if peak else
+          f"Server: {tracebacks} traceback(s) in the log")
+    if args.keep:
+        (workdir / "writes.json").write_text(json.dumps(writes, indent=1, default=str))
+        print(f"Kept {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    lost = result["lost kaflas"] + result["lost rows"] + result["lost edits"] + result["rejected but written"]
+    return 1 if lost or result["feed gaps"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Cross-process locking and atomic file writes.
+
+Several Streamlit replicas may run behind one reverse proxy and share the
+same ``docs/`` tree, so in-process thread locks are not enough. Writers take
+an advisory lock on a file under ``docs/.locks`` and replace data files via
+write-to-temp + rename, so readers only ever see a complete old or new file.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_DIR = Path("docs") / ".locks"
+
+# mkstemp creates 0600 files; give replaced files the usual umask-based mode
+_umask = os.umask(0)
+os.umask(_umask)
+FILE_MODE = 0o666 & ~_umask
+
+# flock is per open file description, so threads of one process also need
+# to be serialised before they reach it
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()
+
+
+def _thread_lock(name):
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(name, threading.RLock())
+
+
+@contextmanager
+def file_lock(name="data"):
+    """Exclusive advisory lock shared by every process using ``docs/``.
+
+    Re-entrant within a thread, so helpers that lock can call each other.
+    """
+    held = getattr(_held, "names", None)
+    if held is None:
+        held = _held.names = {}
+    if held.get(name):
+        held[name] += 1
+        try:
+            yield
+        finally:
+            held[name] -= 1
+        return
+
+    with _thread_lock(name):
+        LOCK_DIR.mkdir(parents=True, exist_ok=True)
+        with open(LOCK_DIR / f"{name}.lock", "a+b") as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            held[name] = 1
+            try:
+                yield
+            finally:
+                held[name] = 0
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                else:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def atomic_write_bytes(path, data):
+    """Write ``data`` to ``path`` so readers never see a partial file."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, FILE_MODE)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def atomic_write_csv(df, path):
+    atomic_write_bytes(path, df.to_csv(index=False).encode("utf-8"))
+
+
+def atomic_copy(src, dst):
+    with open(src, "rb") as f:
+        atomic_write_bytes(dst, f.read())
+
+
+def remove_tree(path):
+    """Delete a folder without exposing a half-deleted tree to other replicas.
+
+    The folder is first renamed out of the way (atomic), then removed.
+    """
+    path = Path(path)
+    trash = path.with_name(f".{path.name}.deleted-{uuid.uuid4().hex[:8]}")
+    try:
+        os.replace(path, trash)
+    except FileNotFoundError:
+        return
+    shutil.rmtree(trash, ignore_errors=True)
@@ -0,0 +1,281 @@
+"""First-page thumbnails of uploaded convoy documents.
+
+Reviewers check certificates from the Submission Status table instead of
+downloading each file. ``schedule`` hands a stored file to a background
+worker right after upload; the worker renders a small JPEG of the image (or
+of a PDF's first page) into ``docs/.previews/ab/<sha256>.jpg``, so a file
+uploaded twice, or to two Kaflas, is rendered once. An index maps each
+document path (with its size and mtime) to its content hash, so a page view
+only stats the file and reads a few KB of cached thumbnail.
+
+PDFs are rasterised with ``pypdfium2`` (in requirements.txt); if it is
+missing, the first page's largest embedded image is used, which covers
+scanned certificates but not vector PDFs. Index updates are batched: the
+worker writes once per burst of uploads and ``rebuild`` once per
+``FLUSH_EVERY`` files. Files uploaded before previews existed are picked up the first
+time they are shown, or all at once with::
+
+    python previews.py
+"""
+import base64
+import hashlib
+import io
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from PIL import Image, ImageDraw, ImageOps
+from PyPDF2 import PdfReader
+
+import data_store
+import locking
+
+try:
+    import pypdfium2 as pdfium
+except ImportError:  # embedded page images only
+    pdfium = None
+
+PREVIEW_DIR = data_store.BASE_DIR / ".previews"
+INDEX_FILE = PREVIEW_DIR / "index.json"
+THUMB_SIZE = (160, 160)
+JPEG_QUALITY = 70
+WORKERS = 2
+# Rendered entries written to the index at once (worker bursts, rebuild)
+FLUSH_EVERY = 50
+
+_lock = threading.Lock()
+_index = {}
+_index_token = None
+_pending = set()
+# Entries rendered by the worker but not yet written to the index
+_unsaved = {}
+_pool = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="preview")
+
+
+# ---------------- Rendering ----------------
+
+def _pdf_first_page(data):
+    if pdfium is not None:
+        try:
+            page = pdfium.PdfDocument(data)[0]
+            scale = 2 * max(THUMB_SIZE) / max(page.get_size())
+            return page.render(scale=scale).to_pil()
+        except Exception:
+            pass
+    try:
+        images = PdfReader(io.BytesIO(data)).pages[0].images
+        largest = max(images, key=lambda i: len(i.data), default=None)
+    except Exception:
+        return None
+    return Image.open(io.BytesIO(largest.data)) if largest is not None else None
+
+
+def render(data, suffix):
+    """Thumbnail JPEG bytes of an image or PDF, or None if it cannot be drawn."""
+    try:
+        if suffix.lower() == ".pdf":
+            image = _pdf_first_page(data)
+            if image is None:
+                return None
+        else:
+            image = Image.open(io.BytesIO(data))
+            # JPEGs decode straight at a reduced scale
+            image.draft("RGB", THUMB_SIZE)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(THUMB_SIZE, Image.LANCZOS)
+        out = io.BytesIO()
+        image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+        return out.getvalue()
+    except Exception:
+        return None
+
+
+def thumbnail_path(digest):
+    return PREVIEW_DIR / digest[:2] / f"{digest}.jpg"
+
+
+# ---------------- Index ----------------
+
+def _rel(path):
+    return Path(path).relative_to(data_store.BASE_DIR).as_posix()
+
+
+def _load_index():
+    # Reread only when another worker or replica replaced the file
+    global _index, _index_token
+    try:
+        stat = INDEX_FILE.stat()
+    except FileNotFoundError:
+        return _index
+    token = (stat.st_ino, stat.st_mtime_ns)
+    if token != _index_token:
+        _index = json.loads(INDEX_FILE.read_text())
+        _index_token = token
+    return _index
+
+
+def _save_index(index):
+    global _index, _index_token
+    locking.atomic_write_bytes(INDEX_FILE, json.dumps(index).encode("utf-8"))
+    stat = INDEX_FILE.stat()
+    _index, _index_token = index, (stat.st_ino, stat.st_mtime_ns)
+
+
+def _lookup(path, stat):
+    rel = _rel(path)
+    with _lock:
+        entry = _unsaved.get(rel)
+    if entry is None:
+        entry = _load_index().get(rel)
+    if entry is None or (entry["size"], entry["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+        return None
+    return entry
+
+
+def _render_entry(path):
+    """Render the preview of ``path`` if needed; return its index entry."""
+    path = Path(path)
+    stat = path.stat()
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    thumb = thumbnail_path(digest)
+    ok = thumb.exists()
+    if not ok:
+        rendered = render(data, path.suffix)
+        if rendered is not None:
+            locking.atomic_write_bytes(thumb, rendered)
+            ok = True
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest, "preview": ok}
+
+
+def _save_entries(entries, keep=None):
+    """Merge ``{rel: entry}`` into the index in one write; ``keep`` filters it."""
+    with locking.file_lock("previews"), _lock:
+        index = dict(_load_index())
+        index.update(entries)
+        if keep is not None:
+            index = {rel: e for rel, e in index.items() if keep(rel)}
+        _save_index(index)
+        return index
+
+
+def build(path):
+    """Render and index the preview of ``path`` now; return its index entry."""
+    entry = _render_entry(path)
+    _save_entries({_rel(path): entry})
+    return entry
+
+
+def _flush():
+    # The last render of a burst (or every FLUSH_EVERY renders) writes the index
+    with _lock:
+        if not _unsaved or (_pending and len(_unsaved) < FLUSH_EVERY):
+            return
+        entries = dict(_unsaved)
+    _save_entries(entries)
+    with _lock:
+        for rel, entry in entries.items():
+            if _unsaved.get(rel) is entry:
+                del _unsaved[rel]
+
+
+def _build_pending(path, rel):
+    try:
+        entry = _render_entry(path)
+        with _lock:
+            _unsaved[rel] = entry
+    except FileNotFoundError:
+        pass
+    finally:
+        with _lock:
+            _pending.discard(rel)
+        _flush()
+
+
+def schedule(path):
+    """Render the preview of ``path`` in the background (once at a time)."""
+    rel = _rel(path)
+    with _lock:
+        if rel in _pending:
+            return
+        _pending.add(rel)
+    _pool.submit(_build_pending, Path(path), rel)
+
+
+# ---------------- Display ----------------
+
+@lru_cache(maxsize=4096)
+def _data_uri(digest):
+    # Thumbnails are named by content, so they never change once written
+    return "data:image/jpeg;base64," + base64.b64encode(thumbnail_path(digest).read_bytes()).decode()
+
+
+@lru_cache(maxsize=None)
+def placeholder(label):
+    """Grey card with ``label``, for documents without a preview (yet)."""
+    image = Image.new("RGB", (THUMB_SIZE[0], THUMB_SIZE[1] * 4 // 3), "#d9d9d9")
+    ImageDraw.Draw(image).text((12, 12), label, fill="#333333")
+    out = io.BytesIO()
+    image.save(out, "PNG")
+    return "data:image/png;base64," + base64.b64encode(out.getvalue()).decode()
+
+
+def preview_uri(path):
+    """Data URI of the thumbnail of ``path``; None if the file does not exist.
+
+    Never renders: a document not previewed yet is queued for the worker
+    and shown as a placeholder meanwhile.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    kind = Path(path).suffix.upper().lstrip(".") or "FILE"
+    entry = _lookup(path, stat)
+    if entry is not None and not entry["preview"]:
+        return placeholder(f"{kind}\nno preview")
+    if entry is not None and thumbnail_path(entry["sha256"]).exists():
+        return _data_uri(entry["sha256"])
+    schedule(path)
+    return placeholder(f"{kind}\npreparing")
+
+
+def folder_preview(folder):
+    """Preview of the first document in ``folder``, or None if it has none."""
+    try:
+        names = sorted(e.name for e in os.scandir(folder) if e.is_file() and not e.name.startswith("."))
+    except FileNotFoundError:
+        return None
+    return preview_uri(Path(folder) / names[0]) if names else None
+
+
+def rebuild(root=data_store.BASE_DIR / "convoy_docs"):
+    """Preview every document under ``root`` and forget deleted ones."""
+    rendered = 0
+    entries = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        for name in sorted(filenames):
+            path = Path(dirpath) / name
+            if not name.startswith(".") and _lookup(path, path.stat()) is None:
+                entries[_rel(path)] = _render_entry(path)
+                rendered += 1
+                if len(entries) >= FLUSH_EVERY:
+                    _save_entries(entries)
+                    entries = {}
+    index = _save_entries(entries, keep=lambda rel: (data_store.BASE_DIR / rel).exists())
+    keep = {e["sha256"] for e in index.values()}
+    removed = 0
+    for thumb in PREVIEW_DIR.glob("*/*.jpg"):
+        if thumb.stem not in keep:
+            thumb.unlink()
+            removed += 1
+    return rendered, removed
+
+
+if __name__ == "__main__":
+    rendered, removed = rebuild()
+    print(f"{rendered} preview(s) rendered, {removed} unused thumbnail(s) removed")
@@ -0,0 +1,270 @@
+"""Reconcile the ``docs/`` tree with the Kafla and Zaireen records.
+
+Zaireen documents have been written to three layouts over time:
+
+* ``docs/<kafla>/zaireen/<passport>/<type>.jpg``, the canonical one
+  (Zaireen Entry, Admin and ``ZaireenRecord.doc_path``);
+* ``docs/zaireen_docs/<kafla>/<passport>/<passport>_<type>.jpg`` (old audit page);
+* ``docs/zaireen_docs/<zaireen id>/<type>.pdf`` (old convoy PDF merge).
+
+``scan`` lists the tree with a thread pool, one task per Kafla folder, and
+remembers each directory's listing with its mtime; a rerun only lists the
+directories that changed since. ``build_report`` maps every file to the
+record it belongs to and marks it ``ok``, ``migrate`` (legacy layout),
+``duplicate``, ``orphan`` (record gone) or ``unknown``. ``migrate`` moves
+files into the canonical layout and ``collect_garbage`` deletes orphans and
+duplicates once they are older than a grace period, so uploads whose record
+is still being saved are left alone::
+
+    python reconcile.py                 # report only
+    python reconcile.py --migrate --gc
+"""
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+import data_store
+import locking
+from image_ingest import store_document
+
+BASE_DIR = data_store.BASE_DIR
+CACHE_FILE = BASE_DIR / ".reconcile-cache.json"
+DOC_TYPES = ("passport", "iran", "iraq")
+# Kafla-level folders written by Kafla Registration
+KAFLA_FOLDERS = ("registration", "vehicle", "others")
+# Folders under docs/ that hold no documents
+SKIP_DIRS = {"snapshots", "journal", "temp_uploads"}
+# Folders whose children are per-Kafla (or per-Zaireen) trees
+GROUP_DIRS = ("convoy_docs", "zaireen_docs")
+GC_GRACE = 24 * 3600
+WORKERS = 8
+# Directories modified this recently are re-listed even if the mtime
+# matches (coarse filesystem timestamps)
+RACY_NS = 2 * 10 ** 9
+
+REPORT_COLUMNS = ["Path", "Status", "Kafla Code", "Passport Number", "Document", "Target"]
+
+
+# ---------------- Scanning ----------------
+
+def _load_cache():
+    try:
+        return json.loads(CACHE_FILE.read_text())
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def _scan_dir(rel, cache, fresh, now_ns):
+    """Files under ``docs/<rel>``; returns (paths, directories listed)."""
+    path = os.path.join(BASE_DIR, rel)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return [], 0
+    hit = cache.get(rel)
+    listed = 0
+    if hit is not None and hit["mtime_ns"] == mtime and now_ns - mtime > RACY_NS:
+        files, dirs = hit["files"], hit["dirs"]
+    else:
+        files, dirs = [], []
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                (dirs if entry.is_dir(follow_symlinks=False) else files).append(entry.name)
+        files.sort()
+        dirs.sort()
+        listed = 1
+    fresh[rel] = {"mtime_ns": mtime, "files": files, "dirs": dirs}
+
+    paths = [f"{rel}/{name}" for name in files]
+    for name in dirs:
+        sub_paths, sub_listed = _scan_dir(f"{rel}/{name}", cache, fresh, now_ns)
+        paths += sub_paths
+        listed += sub_listed
+    return paths, listed
+
+
+def _roots():
+    roots = []
+    for entry in sorted(os.scandir(BASE_DIR), key=lambda e: e.name):
+        if entry.name.startswith(".") or entry.name in SKIP_DIRS or not entry.is_dir():
+            continue
+        if entry.name in GROUP_DIRS:
+            roots += [f"{entry.name}/{e.name}" for e in sorted(os.scandir(entry.path), key=lambda e: e.name)
+                      if e.is_dir() and not e.name.startswith(".")]
+        else:
+            roots.append(entry.name)
+    return roots
+
+
+def scan(workers=WORKERS, use_cache=True):
+    """Every document path (relative to ``docs/``) and scan statistics."""
+    if not BASE_DIR.is_dir():
+        return [], {"roots": 0, "dirs": 0, "listed": 0}
+    cache = _load_cache() if use_cache else {}
+    now_ns = time.time_ns()
+    roots = _roots()
+
+    def task(rel):
+        fresh = {}
+        paths, listed = _scan_dir(rel, cache, fresh, now_ns)
+        return paths, listed, fresh
+
+    files, listed, fresh = [], 0, {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for paths, n, seen in pool.map(task, roots):
+            files += paths
+            listed += n
+            fresh.update(seen)
+    locking.atomic_write_bytes(CACHE_FILE, json.dumps(fresh).encode("utf-8"))
+    return files, {"roots": len(roots), "dirs": len(fresh), "listed": listed}
+
+
+# ---------------- Mapping files to records ----------------
+
+def classify(rel):
+    """Record key of a path relative to ``docs/``, or None if unrecognised."""
+    parts = rel.split("/")
+    stem, ext = os.path.splitext(parts[-1])
+    if parts[0] == "convoy_docs":
+        return {"kind": "kafla", "kafla": parts[1]} if len(parts) >= 3 else None
+    if parts[0] == "zaireen_docs":
+        if len(parts) == 4 and stem.startswith(parts[2] + "_"):
+            doc_type = stem[len(parts[2]) + 1:]
+            if doc_type in DOC_TYPES:
+                return {"kind": "zaireen", "kafla": parts[1], "passport": parts[2],
+                        "doc_type": doc_type, "ext": ext}
+        if len(parts) == 3 and stem in DOC_TYPES:
+            return {"kind": "zaireen", "zaireen_id": parts[1], "doc_type": stem, "ext": ext}
+        return None
+    if len(parts) == 4 and parts[1] == "zaireen" and stem in DOC_TYPES:
+        return {"kind": "zaireen", "kafla": parts[0], "passport": parts[2], "doc_type": stem, "ext": ext}
+    if len(parts) >= 3 and parts[1] in KAFLA_FOLDERS:
+        return {"kind": "kafla", "kafla": parts[0]}
+    return None
+
+
+def canonical_path(kafla_code, passport, doc_type, ext):
+    """Canonical location (relative to ``docs/``) of a Zaireen document."""
+    ext = ".pdf" if ext.lower() == ".pdf" else ".jpg"
+    return f"{kafla_code}/zaireen/{passport}/{doc_type}{ext}"
+
+
+def build_report(files):
+    """One row per file: what it belongs to and what should happen to it."""
+    kafla = data_store.load_kafla()
+    zaireen = data_store.load_zaireen()
+    kafla_codes = set(kafla["Kafla Code"].astype(str))
+    zaireen_keys = set(zip(zaireen["Kafla Code"].astype(str), zaireen["Passport Number"].astype(str)))
+    ids = zaireen[zaireen["Zaireen ID"] != ""]
+    by_id = dict(zip(ids["Zaireen ID"], zip(ids["Kafla Code"].astype(str), ids["Passport Number"])))
+
+    present = set(files)
+    claimed = set()
+    rows = []
+    # Canonical files first, so a legacy copy of an existing file is a duplicate
+    for rel in sorted(files, key=lambda r: r.startswith("zaireen_docs/")):
+        key = classify(rel)
+        row = {"Path": rel, "Status": "unknown", "Kafla Code": "", "Passport Number": "",
+               "Document": "", "Target": ""}
+        if key is not None and key["kind"] == "kafla":
+            row["Kafla Code"] = key["kafla"]
+            row["Status"] = "ok" if key["kafla"] in kafla_codes else "orphan"
+        elif key is not None:
+            if "zaireen_id" in key:
+                key["kafla"], key["passport"] = by_id.get(key["zaireen_id"], ("", ""))
+            row.update({"Kafla Code": key["kafla"], "Passport Number": key["passport"],
+                        "Document": key["doc_type"]})
+            if (key["kafla"], key["passport"]) not in zaireen_keys:
+                row["Status"] = "orphan"
+            else:
+                target = canonical_path(key["kafla"], key["passport"], key["doc_type"], key["ext"])
+                if rel == target:
+                    row["Status"] = "ok"
+                elif target in present or target in claimed:
+                    row["Status"] = "duplicate"
+                else:
+                    row["Status"] = "migrate"
+                    row["Target"] = target
+                claimed.add(target)
+        rows.append(row)
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+# ---------------- Acting on the report ----------------
+
+def _prune_empty(path):
+    # Remove folders left empty, up to (not including) docs/
+    path = path.parent
+    while path != BASE_DIR and BASE_DIR in path.parents:
+        try:
+            path.rmdir()
+        except OSError:
+            return
+        path = path.parent
+
+
+def migrate(report):
+    """Move ``migrate`` files into the canonical layout; return how many moved."""
+    moved = 0
+    for row in report[report["Status"] == "migrate"].itertuples():
+        src, dst = BASE_DIR / row.Path, BASE_DIR / row.Target
+        if not src.exists() or dst.exists():
+            continue
+        if src.suffix.lower() in (".jpg", ".pdf"):
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(src, dst)
+        else:
+            # Other image formats go through the normal ingest (-> .jpg)
+            store_document(src.read_bytes(), dst)
+            src.unlink()
+        _prune_empty(src)
+        moved += 1
+    return moved
+
+
+def collect_garbage(report, grace=GC_GRACE):
+    """Delete orphans and duplicates older than ``grace`` seconds; return (files, bytes)."""
+    cutoff = time.time() - grace
+    removed = freed = 0
+    for row in report[report["Status"].isin(["orphan", "duplicate"])].itertuples():
+        path = BASE_DIR / row.Path
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        if stat.st_mtime > cutoff:
+            continue
+        path.unlink()
+        _prune_empty(path)
+        removed += 1
+        freed += stat.st_size
+    return removed, freed
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Reconcile docs/ with the Kafla and Zaireen records")
+    parser.add_argument("--migrate", action="store_true", help="move legacy files to the canonical layout")
+    parser.add_argument("--gc", action="store_true", help="delete orphans and duplicates")
+    parser.add_argument("--grace-hours", type=float, default=GC_GRACE / 3600)
+    parser.add_argument("--full", action="store_true", help="ignore the directory cache")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    files, stats = scan(args.workers, use_cache=not args.full)
+    report = build_report(files)
+    print(f"{len(files):,} file(s) in {stats['dirs']:,} folder(s), {stats['listed']:,} listed, "
+          f"{time.perf_counter() - start:.2f}s")
+    print(report["Status"].value_counts().to_string())
+    if args.migrate:
+        print(f"{migrate(report)} file(s) migrated")
+    if args.gc:
+        removed, freed = collect_garbage(report, args.grace_hours * 3600)
+        print(f"{removed} file(s) removed, {freed / 1e6:.1f} MB freed")
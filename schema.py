@@ -0,0 +1,145 @@
+"""Column schema and typed loaders for the Kafla and Zaireen tables.
+
+One place that says what each column is called and how it is typed:
+
+* low-cardinality text (City, Province, Country, Season, Nationality, Sex
+  and the Zaireen's Kafla Code) is categorical, so thousands of repeats cost one
+  small integer code each;
+* identifiers and phone/CNIC numbers stay strings, so leading zeros survive;
+* DOB/Expiry/Scan Time/Created At are real datetimes.
+
+Older CSVs used "Full Name" and "ID" for Zaireen columns; they are renamed to
+the canonical names on load.
+"""
+from pathlib import Path
+
+import pandas as pd
+
+# Root of the stored documents and the Zaireen table
+BASE_DIR = Path("docs")
+
+KAFLA_COLUMNS = [
+    "Kafla Code", "Kafla Name", "City", "Province", "Country",
+    "Salar Name", "Salar CNIC", "Salar Contact", "Contact", "Departure Date", "Season", "Created At",
+]
+ZAIREEN_COLUMNS = [
+    "Kafla Code", "Zaireen ID", "Zaireen Name", "Passport Number", "Nationality",
+    "Date of Birth", "Sex", "Expiry Date", "Scan Time", "Iran Visa", "Iraq Visa", "Contact",
+]
+
+COLUMN_ALIASES = {
+    "Full Name": "Zaireen Name",
+    "ID": "Zaireen ID",
+}
+
+CATEGORICAL = {
+    "kafla": ["City", "Province", "Country", "Season"],
+    "zaireen": ["Kafla Code", "Nationality", "Sex"],
+}
+DATES = {
+    "kafla": ["Departure Date", "Created At"],
+    "zaireen": ["Date of Birth", "Expiry Date", "Scan Time"],
+}
+COLUMNS = {"kafla": KAFLA_COLUMNS, "zaireen": ZAIREEN_COLUMNS}
+
+
+def coerce(df, table):
+    """Bring ``df`` to the canonical columns and dtypes (in place where possible).
+
+    Columns already of the right dtype are left alone, so this is cheap to
+    call after small edits.
+    """
+    if any(col in df.columns for col in COLUMN_ALIASES):
+        df = df.rename(columns=COLUMN_ALIASES)
+    for col in COLUMNS[table]:
+        if col not in df.columns:
+            df[col] = pd.NaT if col in DATES[table] else ""
+    for col in df.columns:
+        series = df[col]
+        if col in DATES[table]:
+            if not pd.api.types.is_datetime64_any_dtype(series):
+                df[col] = pd.to_datetime(series.where(series != ""), errors="coerce")
+        elif col in CATEGORICAL[table]:
+            if not isinstance(series.dtype, pd.CategoricalDtype):
+                df[col] = series.fillna("").astype(str).astype("category")
+        elif series.dtype != object or series.isna().any():
+            df[col] = series.where(series.notna(), "").astype(str)
+    return df
+
+
+def read_csv(path, table):
+    """Typed, canonical frame for ``table`` from ``path`` (empty if missing)."""
+    if path.exists():
+        df = pd.read_csv(path, dtype=str, keep_default_na=False)
+    else:
+        df = pd.DataFrame(columns=COLUMNS[table])
+    return coerce(df, table)
+
+
+def add_category(df, col, value):
+    """Make ``value`` assignable to categorical column ``col``."""
+    series = df[col]
+    if isinstance(series.dtype, pd.CategoricalDtype) and value not in series.cat.categories:
+        df[col] = series.cat.add_categories([value])
+
+
+def fmt_date(value, with_time=False):
+    """Display/PDF form of a date cell; empty for missing values."""
+    if value is None or pd.isna(value):
+        return ""
+    if not isinstance(value, pd.Timestamp):
+        return str(value)
+    return value.strftime("%Y-%m-%d %H:%M:%S" if with_time else "%Y-%m-%d")
+
+
+def display_frame(df):
+    """Copy of ``df`` with plain strings everywhere, for tables and reports."""
+    out = df.copy()
+    for col in out.columns:
+        if pd.api.types.is_datetime64_any_dtype(out[col]):
+            with_time = col in ("Scan Time", "Created At")
+            out[col] = out[col].map(lambda v: fmt_date(v, with_time))
+        else:
+            out[col] = out[col].astype(object).where(out[col].notna(), "")
+    return out
+
+
+class ZaireenRecord:
+    """Compact per-row view of a Zaireen, for loops that build document paths."""
+
+    __slots__ = (
+        "kafla_code", "zaireen_id", "name", "passport", "nationality",
+        "dob", "sex", "expiry", "scan_time", "iran_visa", "iraq_visa", "contact",
+    )
+
+    def __init__(self, kafla_code, zaireen_id, name, passport, nationality,
+                 dob, sex, expiry, scan_time, iran_visa, iraq_visa, contact):
+        self.kafla_code = kafla_code
+        self.zaireen_id = zaireen_id
+        self.name = name
+        self.passport = passport
+        self.nationality = nationality
+        self.dob = dob
+        self.sex = sex
+        self.expiry = expiry
+        self.scan_time = scan_time
+        self.iran_visa = iran_visa
+        self.iraq_visa = iraq_visa
+        self.contact = contact
+
+    @classmethod
+    def from_frame(cls, df):
+        """Records for every row of a canonical Zaireen frame."""
+        cols = df[ZAIREEN_COLUMNS]
+        return [cls(*values) for values in cols.itertuples(index=False, name=None)]
+
+    @property
+    def doc_dir(self):
+        return BASE_DIR / str(self.kafla_code) / "zaireen" / str(self.passport)
+
+    def doc_path(self, doc_type):
+        """``passport``, ``iran`` or ``iraq`` image of this Zaireen."""
+        return self.doc_dir / f"{doc_type}.jpg"
+
+    def __repr__(self):
+        return f"ZaireenRecord({self.kafla_code!r}, {self.passport!r}, {self.name!r})"
@@ -0,0 +1,260 @@
+"""Season partitions of the Kafla/Zaireen data and their cold archives.
+
+The live files (``kafla.csv``, ``docs/zaireen.csv`` and the ``docs/`` tree)
+are the *active* partition; every page reads only those through
+``data_store``. Once a season is over, ``archive_season`` moves its Kaflas,
+their Zaireen and all their documents into one compressed, read-only
+``archive/<season>.zip`` and drops them from the live files, so page loads
+only ever pay for the seasons still active.
+
+Past seasons are read back explicitly with ``load_season`` or, across all
+seasons, ``load_all``::
+
+    python seasons.py list
+    python seasons.py archive 2024
+"""
+import os
+import tempfile
+import zipfile
+from datetime import date
+from pathlib import Path
+
+import pandas as pd
+
+import change_feed
+import data_store
+import locking
+import schema
+from bundle_export import CHUNK_SIZE, STORED_SUFFIXES
+
+ARCHIVE_DIR = Path("archive")
+CURRENT_SEASON = os.environ.get("ZAIREEN_SEASON") or str(date.today().year)
+# Per-Kafla document folders, relative to the app root
+DOC_ROOTS = [
+    data_store.BASE_DIR,
+    data_store.BASE_DIR / "convoy_docs",
+    data_store.BASE_DIR / "zaireen_docs",
+]
+
+_archives = {}
+
+
+def season_of(kafla):
+    """Season of each Kafla row: its Season column, else the departure
+    (or registration) year, else the current season."""
+    season = kafla["Season"].astype(str)
+    year = kafla["Departure Date"].fillna(kafla["Created At"]).dt.year
+    year = year.astype("Int64").astype(str).replace("<NA>", CURRENT_SEASON)
+    return season.where(season != "", year)
+
+
+def kafla_seasons():
+    """``{kafla_code: season}`` for the active partition."""
+    def build():
+        kafla = data_store.load_kafla()
+        return dict(zip(kafla["Kafla Code"].astype(str), season_of(kafla)))
+
+    return data_store.derived("kafla_seasons", build, tables=("kafla",))
+
+
+def kafla_season(kafla_code):
+    return kafla_seasons().get(str(kafla_code), CURRENT_SEASON)
+
+
+def active_seasons():
+    return sorted(set(kafla_seasons().values()))
+
+
+def archived_seasons():
+    return sorted(path.stem for path in ARCHIVE_DIR.glob("*.zip"))
+
+
+def archive_path(season):
+    return ARCHIVE_DIR / f"{season}.zip"
+
+
+# ---------------- Reading archives ----------------
+
+def _read_member(zf, table):
+    with zf.open(f"{table}.csv") as f:
+        return pd.read_csv(f, dtype=str, keep_default_na=False)
+
+
+def load_season(season, table):
+    """Typed frame of ``table`` for one season.
+
+    Archived seasons come from their archive (read once, archives never
+    change in place); active ones are the matching slice of the live data.
+    """
+    season = str(season)
+    path = archive_path(season)
+    if not path.exists():
+        kafla = data_store.load_kafla()
+        codes = kafla.loc[season_of(kafla) == season, "Kafla Code"]
+        if table == "kafla":
+            return kafla[kafla["Kafla Code"].isin(codes)]
+        zaireen = data_store.load_zaireen()
+        return zaireen[zaireen["Kafla Code"].isin(codes)]
+
+    stat = path.stat()
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    hit = _archives.get((season, table))
+    if hit is not None and hit[0] == stamp:
+        return hit[1]
+    with zipfile.ZipFile(path) as zf:
+        df = schema.coerce(_read_member(zf, table), table)
+    _archives[(season, table)] = (stamp, df)
+    return df
+
+
+def load_all(table):
+    """Active data plus every archived season, for explicit cross-season queries."""
+    live = data_store.load_kafla() if table == "kafla" else data_store.load_zaireen()
+    frames = [load_season(season, table) for season in archived_seasons()] + [live]
+    return schema.coerce(pd.concat(frames, ignore_index=True), table)
+
+
+def merged(season=None):
+    """Zaireen joined with their Kafla for one season (or all, with ``"all"``)."""
+    if season is None:
+        return data_store.merged_zaireen()
+    if season == "all":
+        kafla, zaireen = load_all("kafla"), load_all("zaireen")
+    else:
+        kafla, zaireen = load_season(season, "kafla"), load_season(season, "zaireen")
+    return zaireen.merge(kafla, on="Kafla Code", how="left", suffixes=("", " (Kafla)"))
+
+
+# ---------------- Archiving ----------------
+
+def _document_files(codes):
+    """Yield ``(archive name, path)`` for every document of the given Kaflas."""
+    for root in DOC_ROOTS:
+        for code in codes:
+            folder = root / code
+            if not folder.is_dir():
+                continue
+            for path in sorted(folder.rglob("*")):
+                if path.is_file() and not any(p.startswith(".") for p in path.relative_to(folder).parts):
+                    yield path.as_posix(), path
+
+
+def _add_file(zf, arcname, path):
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    stored = path.suffix.lower() in STORED_SUFFIXES
+    info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+    with open(path, "rb") as src, zf.open(info, "w", force_zip64=True) as dst:
+        _copy(src, dst)
+
+
+def _copy(src, dst):
+    while True:
+        chunk = src.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        dst.write(chunk)
+
+
+def _write_archive(season, kafla_rows, zaireen_rows, codes):
+    """Write (or extend) ``archive/<season>.zip`` and make it read-only."""
+    path = archive_path(season)
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    tables = {"kafla": kafla_rows, "zaireen": zaireen_rows}
+    new_files = dict(_document_files(codes))
+
+    old = zipfile.ZipFile(path) if path.exists() else None
+    fd, tmp = tempfile.mkstemp(dir=ARCHIVE_DIR, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            with zipfile.ZipFile(f, "w", allowZip64=True) as zf:
+                for table, rows in tables.items():
+                    rows = schema.display_frame(rows)
+                    if old is not None:
+                        # Re-archiving (e.g. a late Kafla) merges; newest row wins
+                        rows = pd.concat([_read_member(old, table), rows], ignore_index=True)
+                        rows = rows.drop_duplicates(data_store.KEYS[table], keep="last")
+                    zf.writestr(f"{table}.csv", rows.to_csv(index=False), zipfile.ZIP_DEFLATED)
+                if old is not None:
+                    for info in old.infolist():
+                        if info.filename in ("kafla.csv", "zaireen.csv") or info.filename in new_files:
+                            continue
+                        with old.open(info) as src, zf.open(info, "w", force_zip64=True) as dst:
+                            _copy(src, dst)
+                for arcname, file in new_files.items():
+                    _add_file(zf, arcname, file)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp, 0o444)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    finally:
+        if old is not None:
+            old.close()
+
+
+def is_past(season):
+    """True for a numeric season earlier than the current one."""
+    season = str(season)
+    return season.isdigit() and CURRENT_SEASON.isdigit() and int(season) < int(CURRENT_SEASON)
+
+
+def archive_season(season):
+    """Move a past season out of the active partition; return the Kaflas moved.
+
+    Raises ``data_store.ConflictError`` if one of the Kaflas is edited while
+    the archive is being written; nothing is removed then, so just retry.
+    """
+    season = str(season)
+    # Kaflas departing in a later year carry a future season; only finished ones go
+    if not is_past(season):
+        raise ValueError(f"Only seasons before {CURRENT_SEASON} can be archived, not {season!r}.")
+
+    with locking.file_lock("archive"):
+        seq = data_store.data_version()
+        kafla = data_store.load_kafla()
+        codes = kafla.loc[season_of(kafla) == season, "Kafla Code"].astype(str).tolist()
+        if not codes:
+            return []
+        zaireen = data_store.load_zaireen()
+        _write_archive(
+            season,
+            kafla[kafla["Kafla Code"].astype(str).isin(codes)].assign(Season=season),
+            zaireen[zaireen["Kafla Code"].astype(str).isin(codes)],
+            codes,
+        )
+
+        with locking.file_lock("data"):
+            moved = set(codes)
+            changed = change_feed.changes_since(seq)
+            if changed is None or any(str(e["key"].get("Kafla Code")) in moved for e in changed):
+                raise data_store.ConflictError("Kaflas of this season changed while archiving.")
+            data_store.delete_kaflas(codes)
+        for root in DOC_ROOTS:
+            for code in codes:
+                locking.remove_tree(root / code)
+    return codes
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="List or archive Kafla seasons")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="show active and archived seasons")
+    p = sub.add_parser("archive", help="move a past season into archive/<season>.zip")
+    p.add_argument("season")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        counts = pd.Series(kafla_seasons()).value_counts()
+        for season in active_seasons():
+            print(f"{season}  active    {counts[season]} Kafla(s)")
+        for season in archived_seasons():
+            size = archive_path(season).stat().st_size / 1e6
+            print(f"{season}  archived  {len(load_season(season, 'kafla'))} Kafla(s), {size:.1f} MB")
+    else:
+        moved = archive_season(args.season)
+        print(f"{len(moved)} Kafla(s) of {args.season} archived to {archive_path(args.season)}")
@@ -0,0 +1,154 @@
+"""Declarative, vectorised validation of the Zaireen and Kafla tables.
+
+Each rule is a plain dict: which table it looks at, how serious it is, the
+message shown to volunteers and a ``check(df, today)`` that returns a boolean
+Series marking the failing rows. Checks operate on whole columns at once, so
+a full season (100k Zaireen) is validated in a fraction of a second.
+
+Zaireen rules see the Zaireen rows joined with their Kafla (for the
+departure date); a Kafla without a departure date is checked against today.
+"""
+import pandas as pd
+
+import data_store
+
+MIN_VALIDITY = pd.DateOffset(months=6)
+ADULT_AGE = 18
+CNIC_PATTERN = r"\d{13}"
+CONTACT_PATTERN = r"\d{11}"
+
+
+def _departure(df, today):
+    return df["Departure Date"].fillna(today)
+
+
+def _age_at(dob, when):
+    # Whole years between two datetime Series, without a per-row apply
+    before_birthday = (when.dt.month * 100 + when.dt.day) < (dob.dt.month * 100 + dob.dt.day)
+    return when.dt.year - dob.dt.year - before_birthday.astype(int)
+
+
+def _bad_format(series, pattern):
+    text = series.astype(str).str.strip()
+    return (text != "") & ~text.str.fullmatch(pattern)
+
+
+RULES = [
+    # ---- Zaireen ----
+    {
+        "id": "passport_missing", "table": "zaireen", "severity": "error",
+        "message": "Passport number is missing",
+        "check": lambda df, today: df["Passport Number"].str.strip() == "",
+    },
+    {
+        "id": "passport_expired", "table": "zaireen", "severity": "error",
+        "message": "Passport expires before departure",
+        "check": lambda df, today: df["Expiry Date"] < _departure(df, today),
+    },
+    {
+        "id": "passport_validity", "table": "zaireen", "severity": "error",
+        "message": "Passport valid for less than 6 months after departure",
+        "check": lambda df, today: (df["Expiry Date"] >= _departure(df, today))
+        & (df["Expiry Date"] < _departure(df, today) + MIN_VALIDITY),
+    },
+    {
+        "id": "expiry_missing", "table": "zaireen", "severity": "warning",
+        "message": "Passport expiry date is missing or malformed",
+        "check": lambda df, today: df["Expiry Date"].isna(),
+    },
+    {
+        "id": "dob_missing", "table": "zaireen", "severity": "error",
+        "message": "Date of birth is missing or malformed",
+        "check": lambda df, today: df["Date of Birth"].isna(),
+    },
+    {
+        # convert_mrz_date maps YY < 50 to 20YY, so a 1945 birth becomes 2045
+        "id": "dob_in_future", "table": "zaireen", "severity": "error",
+        "message": "Date of birth is in the future (check the MRZ century)",
+        "check": lambda df, today: df["Date of Birth"] > today,
+    },
+    {
+        "id": "underage", "table": "zaireen", "severity": "warning",
+        "message": f"Under {ADULT_AGE} at departure; guardian consent needed",
+        "check": lambda df, today: (df["Date of Birth"] <= today)
+        & (_age_at(df["Date of Birth"], _departure(df, today)) < ADULT_AGE),
+    },
+    {
+        "id": "sex_unknown", "table": "zaireen", "severity": "warning",
+        "message": "Sex is not M or F",
+        "check": lambda df, today: ~df["Sex"].isin(["M", "F"]),
+    },
+    {
+        "id": "passport_duplicate", "table": "zaireen", "severity": "warning",
+        "message": "Passport registered more than once",
+        "check": lambda df, today: (df["Passport Number"] != "")
+        & df["Passport Number"].str.upper().duplicated(keep=False),
+    },
+    {
+        "id": "contact_format", "table": "zaireen", "severity": "warning",
+        "message": "Contact number is not 11 digits",
+        "check": lambda df, today: _bad_format(df["Contact"], CONTACT_PATTERN),
+    },
+    # ---- Kafla ----
+    {
+        "id": "salar_cnic_format", "table": "kafla", "severity": "error",
+        "message": "Salar CNIC is not 13 digits",
+        "check": lambda df, today: ~df["Salar CNIC"].astype(str).str.fullmatch(CNIC_PATTERN),
+    },
+    {
+        "id": "salar_contact_format", "table": "kafla", "severity": "error",
+        "message": "Salar contact is not 11 digits",
+        "check": lambda df, today: ~df["Salar Contact"].astype(str).str.fullmatch(CONTACT_PATTERN),
+    },
+    {
+        "id": "departure_missing", "table": "kafla", "severity": "warning",
+        "message": "No departure date; passport checks use today's date",
+        "check": lambda df, today: df["Departure Date"].isna(),
+    },
+]
+
+REPORT_COLUMNS = ["Kafla Code", "Passport Number", "Zaireen Name", "Severity", "Rule", "Message"]
+
+
+def run_checks(zaireen, kafla, today=None, rules=RULES):
+    """Evaluate ``rules`` over whole tables; one report row per failure."""
+    today = pd.Timestamp(today) if today is not None else pd.Timestamp.today().normalize()
+    frames = {
+        "zaireen": zaireen.merge(kafla[["Kafla Code", "Departure Date"]], on="Kafla Code", how="left"),
+        "kafla": kafla,
+    }
+    found = []
+    for rule in rules:
+        df = frames[rule["table"]]
+        mask = rule["check"](df, today).fillna(False).astype(bool)
+        if not mask.any():
+            continue
+        hits = df.loc[mask.to_numpy(), [c for c in ("Kafla Code", "Passport Number", "Zaireen Name") if c in df]]
+        found.append(hits.assign(Severity=rule["severity"], Rule=rule["id"], Message=rule["message"]))
+    if not found:
+        return pd.DataFrame(columns=REPORT_COLUMNS)
+    report = pd.concat(found, ignore_index=True).reindex(columns=REPORT_COLUMNS)
+    report["Kafla Code"] = report["Kafla Code"].astype(str)
+    return report.fillna("")
+
+
+def kafla_summary(report):
+    """Per-Kafla count of errors and warnings, worst first."""
+    if report.empty:
+        return pd.DataFrame(columns=["Kafla Code", "error", "warning"])
+    counts = report.pivot_table(index="Kafla Code", columns="Severity", values="Rule",
+                                aggfunc="count", fill_value=0)
+    counts = counts.reindex(columns=["error", "warning"], fill_value=0)
+    counts.columns.name = None
+    return counts.sort_values(["error", "warning"], ascending=False).reset_index()
+
+
+def exceptions_report():
+    """Report for the current data, cached until the next change or midnight."""
+    # Expiry and age checks move with the date, so the day is part of the key
+    today = pd.Timestamp.today().normalize()
+    return data_store.derived(
+        "validation_report",
+        lambda: run_checks(data_store.load_zaireen(), data_store.load_kafla(), today),
+        extra=today,
+    )
@@ -0,0 +1,204 @@
+"""Bulk ingest of a Kafla's Iran and Iraq visa scans.
+
+Volunteers drop all of a Kafla's visas at once (a multi-file upload on the
+Zaireen Entry page, or a folder on disk) instead of using one uploader per
+Zaireen. A process pool reads the MRZ of every scan in parallel; each visa
+is then matched to its Zaireen through the passport index, by the passport
+number in the MRZ or in the file name (``AB1234567_iran.jpg``), falling back
+to the MRZ surname and date of birth. Matched visas are stored as
+``docs/<kafla>/zaireen/<passport>/<iran|iraq>.jpg`` and the ``Iran Visa`` /
+``Iraq Visa`` columns are filled in one write::
+
+    python visa_ingest.py <kafla_code> scans/ [--country iran]
+"""
+import multiprocessing as mp
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+
+import data_store
+from image_ingest import store_document
+
+# MRZ issuing state -> document type used in the docs tree
+COUNTRIES = {"IRN": "iran", "IRQ": "iraq"}
+COLUMNS = {"iran": "Iran Visa", "iraq": "Iraq Visa"}
+WORKERS = min(4, os.cpu_count() or 1)
+# Passport numbers are 6-9 letters/digits; anything shorter in a file name is noise
+NUMBER_TOKEN = re.compile(r"[A-Z0-9]{6,9}")
+# Stored in the visa column when the MRZ carried no separate visa number
+ON_FILE = "on file"
+
+REPORT_COLUMNS = ["File", "Visa", "Passport Number", "Zaireen Name", "Matched By", "Visa Number", "Status"]
+
+
+# ---------------- MRZ extraction (worker processes) ----------------
+
+def extract(path):
+    """MRZ fields of one visa scan, or ``{"error": ...}``; runs in a worker."""
+    from passporteye import read_mrz
+
+    from image_quality import check_frame
+
+    try:
+        quality = check_frame(Path(path).read_bytes())
+        if not quality["ok"]:
+            return {"error": quality["reason"]}
+        fd, tmp = tempfile.mkstemp(suffix=".jpg")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(quality["data"])
+            mrz = read_mrz(tmp)
+        finally:
+            os.remove(tmp)
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    if mrz is None:
+        return {"error": "Could not read MRZ."}
+    fields = mrz.to_dict()
+    return {key: str(fields.get(key, "")).replace("<", " ").strip() for key in
+            ("mrz_type", "country", "number", "optional1", "surname", "names", "date_of_birth")}
+
+
+def extract_all(paths, workers=WORKERS):
+    """``extract`` over ``paths`` in a process pool, results in order."""
+    paths = [str(p) for p in paths]
+    if not paths:
+        return []
+    # Spawned workers: forking a threaded Streamlit server is not safe
+    with ProcessPoolExecutor(min(workers, len(paths)), mp_context=mp.get_context("spawn")) as pool:
+        return list(pool.map(extract, paths))
+
+
+# ---------------- Matching ----------------
+
+def _mrz_date(value):
+    if not re.fullmatch(r"\d{6}", value or ""):
+        return None
+    year = int(value[:2])
+    year += 1900 if year >= 50 else 2000
+    return pd.to_datetime(f"{year}-{value[2:4]}-{value[4:6]}", errors="coerce")
+
+
+def visa_country(name, fields, country=None):
+    """``"iran"``/``"iraq"``: as given, from the MRZ issuing state or the file name."""
+    if country:
+        return country
+    if fields.get("country") in COUNTRIES:
+        return COUNTRIES[fields["country"]]
+    lowered = name.lower()
+    found = [c for c in COLUMNS if c in lowered]
+    return found[0] if len(found) == 1 else None
+
+
+def match(kafla_code, name, fields, index, zaireen):
+    """``(passport, how)`` of the Zaireen a visa belongs to, or ``(None, reason)``."""
+    tokens = [fields.get("number", ""), fields.get("optional1", "")]
+    tokens += NUMBER_TOKEN.findall(Path(name).stem.upper())
+    elsewhere = None
+    for token in tokens:
+        for code, passport in index.get(data_store.passport_key(token), []):
+            if code == kafla_code:
+                return passport, "passport number"
+            elsewhere = f"Passport {passport} belongs to another Kafla ({code})."
+
+    dob = _mrz_date(fields.get("date_of_birth"))
+    surname = fields.get("surname", "").upper()
+    if dob is not None and surname:
+        rows = zaireen[(zaireen["Date of Birth"] == dob)
+                       & zaireen["Zaireen Name"].str.upper().str.contains(surname, regex=False)]
+        if len(rows) == 1:
+            return rows["Passport Number"].iloc[0], "name and date of birth"
+        if len(rows) > 1:
+            return None, "Several Zaireen share this name and date of birth."
+    if elsewhere:
+        return None, elsewhere
+    if "error" in fields:
+        return None, f"No passport number in the file name; MRZ not read: {fields['error']}"
+    return None, "No Zaireen of this Kafla matches."
+
+
+def ingest(kafla_code, paths, country=None, workers=WORKERS):
+    """Read, match and store the visa scans in ``paths`` for one Kafla.
+
+    ``country`` ("iran" or "iraq") applies to every file; by default it is
+    taken from each visa's MRZ or file name. Returns a report frame with one
+    row per file.
+    """
+    paths = [Path(p) for p in paths]
+    extracted = extract_all(paths, workers)
+
+    zaireen = data_store.load_zaireen()
+    zaireen = zaireen[zaireen["Kafla Code"] == kafla_code]
+    names = dict(zip(zaireen["Passport Number"], zaireen["Zaireen Name"]))
+    index = data_store.passport_index()
+
+    rows, updates, taken = [], {}, set()
+    for path, fields in zip(paths, extracted):
+        row = dict.fromkeys(REPORT_COLUMNS, "")
+        row["File"] = path.name
+        doc_type = visa_country(path.name, fields, country)
+        passport, how = match(kafla_code, path.name, fields, index, zaireen)
+        row["Visa"] = COLUMNS[doc_type] if doc_type else ""
+        if passport is None:
+            row["Status"] = how
+        elif doc_type is None:
+            row["Status"] = "Iran or Iraq? Not in the MRZ or file name."
+        elif (passport, doc_type) in taken:
+            row["Status"] = "Duplicate: another file in this batch is this visa."
+        else:
+            taken.add((passport, doc_type))
+            # The MRZ number is the visa number unless the state prints the passport number there
+            number = fields.get("number", "")
+            if data_store.passport_key(number) == data_store.passport_key(passport):
+                number = ""
+            store_document(path.read_bytes(), data_store.BASE_DIR / kafla_code / "zaireen" / passport / f"{doc_type}.jpg")
+            updates.setdefault(passport, {})[COLUMNS[doc_type]] = number or ON_FILE
+            row.update({"Matched By": how, "Visa Number": number, "Status": "saved"})
+        row["Passport Number"] = passport or ""
+        row["Zaireen Name"] = names.get(passport, "")
+        rows.append(row)
+
+    # One write (and one change-feed batch) for the whole drop
+    if updates:
+        data_store.update_zaireen_many([(kafla_code, p, changes) for p, changes in updates.items()])
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS)
+
+
+def store_one(kafla_code, passport, doc_type, data):
+    """Store a single visa uploaded for a known Zaireen and mark its column.
+
+    No MRZ is read for a one-off upload, so the column records the visa as
+    ``ON_FILE`` rather than by number.
+    """
+    stored = store_document(data, data_store.BASE_DIR / kafla_code / "zaireen" / passport / f"{doc_type}.jpg")
+    data_store.update_zaireen(kafla_code, passport, {COLUMNS[doc_type]: ON_FILE})
+    return stored
+
+
+def _files(paths):
+    files = []
+    for path in map(Path, paths):
+        if path.is_dir():
+            files += sorted(p for p in path.iterdir() if p.suffix.lower() in (".jpg", ".jpeg", ".png"))
+        elif path.exists():
+            files.append(path)
+    return files
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Match and store a Kafla's visa scans")
+    parser.add_argument("kafla_code")
+    parser.add_argument("paths", nargs="+", help="visa scans (files or folders)")
+    parser.add_argument("--country", choices=sorted(COLUMNS), help="default: from each MRZ or file name")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    args = parser.parse_args()
+
+    report = ingest(args.kafla_code, _files(args.paths), args.country, args.workers)
+    print(report.to_string(index=False))
+    print(f"{(report['Status'] == 'saved').sum()} of {len(report)} visa(s) saved")
@@ -1,34 +1,52 @@
 import streamlit as st
 import pandas as pd
-import os
-from pathlib import Path
-from PIL import Image
+import data_store
+import kafla_directory
+import change_feed
+import validation
+from schema import ZaireenRecord
 
 # Setup
 st.set_page_config(page_title="Zaireen Document Audit", layout="wide")
 st.title("🧾 Zaireen Document Audit & Review")
 
 # Paths
-BASE_DIR = Path("docs")
-ZAIREEN_CSV = BASE_DIR / "zaireen.csv"
-KAFLA_CSV = Path("kafla.csv")
-UPLOAD_DIR = BASE_DIR / "zaireen_docs"
+ZAIREEN_CSV = data_store.ZAIREEN_CSV
+KAFLA_CSV = data_store.KAFLA_CSV
 
 if not KAFLA_CSV.exists() or not ZAIREEN_CSV.exists():
     st.error("❗ Kafla or Zaireen data missing. Please enter data first.")
     st.stop()
 
 # Load data
-kafla_df = pd.read_csv(KAFLA_CSV)
-kafla_names = kafla_df.apply(lambda row: f"{row['Kafla Name']} ({row['Salar Name']})", axis=1).tolist()
-kafla_map = dict(zip(kafla_names, kafla_df['Kafla Code']))
-
-selected_kafla = st.selectbox("Select Kafla", kafla_names)
-kafla_code = kafla_map[selected_kafla]
+kafla_code = kafla_directory.select_kafla("Select Kafla", "audit_kafla")
+if kafla_code is None:
+    st.stop()
 
-zdf = pd.read_csv(ZAIREEN_CSV)
+zdf = data_store.load_zaireen()
 zdf = zdf[zdf['Kafla Code'] == kafla_code]
 
+new_changes = change_feed.subscribe("audit")
+if new_changes:
+    st.caption(f"🔔 Updated with {len(new_changes)} new change(s) since your last view.")
+
+# Validation exceptions: Kafla-level issues show even before any Zaireen is added
+st.markdown("### 🚦 Validation Exceptions")
+report = validation.exceptions_report()
+kafla_report = report[report['Kafla Code'] == kafla_code]
+
+if kafla_report.empty:
+    st.success("✅ No validation issues for this Kafla.")
+else:
+    errors = int((kafla_report['Severity'] == "error").sum())
+    st.warning(f"⚠️ {errors} error(s) and {len(kafla_report) - errors} warning(s) for this Kafla.")
+    st.dataframe(kafla_report.drop(columns=["Kafla Code"]), use_container_width=True, hide_index=True)
+
+with st.expander(f"📋 All Kaflas ({len(report)} exception(s))"):
+    st.dataframe(validation.kafla_summary(report), use_container_width=True, hide_index=True)
+    st.download_button("📥 Download Exceptions CSV", data=report.to_csv(index=False),
+                       file_name="validation_exceptions.csv", mime="text/csv")
+
 if zdf.empty:
     st.info("No Zaireen found for this Kafla.")
     st.stop()
@@ -38,22 +56,17 @@ st.markdown("### 📋 Document Status Table")
 summary = {"Total": len(zdf), "Complete": 0, "Incomplete": 0}
 
 data_rows = []
-for index, row in zdf.iterrows():
-    pnum = row['Passport Number']
-    zaireen_dir = UPLOAD_DIR / kafla_code / pnum
-    passport_file = zaireen_dir / f"{pnum}_passport.jpg"
-    iran_file = zaireen_dir / f"{pnum}_iran.jpg"
-    iraq_file = zaireen_dir / f"{pnum}_iraq.jpg"
-
-    p_ok = passport_file.exists()
-    i_ok = iran_file.exists()
-    q_ok = iraq_file.exists()
+for rec in ZaireenRecord.from_frame(zdf):
+    pnum = rec.passport
+    p_ok = rec.doc_path("passport").exists()
+    i_ok = rec.doc_path("iran").exists()
+    q_ok = rec.doc_path("iraq").exists()
 
     complete = all([p_ok, i_ok, q_ok])
     summary["Complete" if complete else "Incomplete"] += 1
 
     data_rows.append({
-        "Name": row['Full Name'],
+        "Name": rec.name,
         "Passport #": pnum,
         "Passport Scan": "✅" if p_ok else "❌",
         "Iran Visa": "✅" if i_ok else "❌",
@@ -72,3 +85,5 @@ st.metric("Incomplete Records", summary['Incomplete'])
 # Export Option
 csv_out = summary_df.to_csv(index=False)
 st.download_button("📥 Download Audit CSV", data=csv_out, file_name=f"audit_{kafla_code}.csv", mime="text/csv")
+
+change_feed.auto_refresh("audit")
@@ -1,5 +1,4 @@
 import streamlit as st
-import pandas as pd
 import os
 import uuid
 from datetime import datetime
@@ -11,15 +10,23 @@ from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph,
 from reportlab.lib import colors
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
+import data_store
+import kafla_directory
+from schema import display_frame, fmt_date
+import locking
+from image_quality import check_frame
+from image_ingest import store_document
+import seasons
+import visa_ingest
 
 # App setup
 # st.set_page_config(page_title="Zaireen Registration", layout="centered")
 st.title("🧕 Zaireen Registration | زائرین کی رجسٹریشن")
 
 # Define storage paths
-BASE_DIR = Path("docs")
-CSV_FILE = BASE_DIR / "zaireen.csv"
-KAFLA_CSV = Path("kafla.csv")
+BASE_DIR = data_store.BASE_DIR
+CSV_FILE = data_store.ZAIREEN_CSV
+KAFLA_CSV = data_store.KAFLA_CSV
 TEMP_UPLOAD_DIR = BASE_DIR / "temp_uploads"
 TEMP_UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
 
@@ -28,33 +35,30 @@ if not KAFLA_CSV.exists():
     st.error("⚠️ No Kafla data found. Please register a Kafla first.")
     st.stop()
 
-kafla_df = pd.read_csv(KAFLA_CSV)
-if kafla_df.empty:
+if not len(kafla_directory.directory()):
     st.error("⚠️ Kafla list is empty. Please add entries first.")
     st.stop()
 
-kafla_names = kafla_df.apply(lambda row: f"{row['Kafla Name']} ({row['Salar Name']})", axis=1).tolist()
-kafla_map = dict(zip(kafla_names, kafla_df["Kafla Code"]))
+kafla_code = kafla_directory.select_kafla("Select Kafla | قافلہ منتخب کریں", "entry_kafla")
 
-selected_kafla_name = st.selectbox("Select Kafla | قافلہ منتخب کریں", options=kafla_names)
-
-if not selected_kafla_name or selected_kafla_name not in kafla_map:
+if kafla_code is None:
     st.warning("⚠️ Please select a valid Kafla.")
     st.stop()
 
-kafla_code = kafla_map[selected_kafla_name]
+selected_kafla_name = kafla_directory.directory().label(kafla_code)
 kafla_dir = BASE_DIR / kafla_code / "zaireen"
 kafla_dir.mkdir(parents=True, exist_ok=True)
 
-# Load existing zaireen
-if CSV_FILE.exists():
-    df = pd.read_csv(CSV_FILE)
-else:
-    df = pd.DataFrame(columns=["Kafla Code", "Zaireen Name", "Passport Number", "Nationality", "Date of Birth", "Sex", "Scan Time"])
+# Load existing zaireen (shared read-only frame; writes go through data_store)
+df = data_store.load_zaireen()
 
 # Session state
 if "uploaded_files" not in st.session_state:
     st.session_state.uploaded_files = []
+if "uploaded_seen" not in st.session_state:
+    st.session_state.uploaded_seen = set()
+if "stored_visas" not in st.session_state:
+    st.session_state.stored_visas = set()
 
 # Utility function
 def convert_mrz_date(mrz_date):
@@ -67,9 +71,16 @@ def convert_mrz_date(mrz_date):
 # Upload via uploader
 st.markdown("### 📦 Upload Passport Images")
 uploaded_files = st.file_uploader("Upload JPG or PNG", accept_multiple_files=True, type=["jpg", "jpeg", "png"])
+# Forget files no longer in the uploader, so adding one again stages it again
+st.session_state.uploaded_seen &= {file.file_id for file in uploaded_files or []}
 if uploaded_files:
     for file in uploaded_files:
-        file_path = TEMP_UPLOAD_DIR / file.name
+        # The uploader re-sends its files on every rerun; stage each only once
+        if file.file_id in st.session_state.uploaded_seen:
+            continue
+        st.session_state.uploaded_seen.add(file.file_id)
+        # Unique name: several volunteers (and replicas) share this folder
+        file_path = TEMP_UPLOAD_DIR / f"{uuid.uuid4().hex[:8]}_{file.name}"
         with open(file_path, "wb") as f:
             f.write(file.read())
         st.session_state.uploaded_files.append(str(file_path))
@@ -78,12 +89,16 @@ if uploaded_files:
 st.markdown("### 📷 Scan Passport (Camera)")
 camera_image = st.camera_input("Capture passport image")
 if camera_image:
-    path = TEMP_UPLOAD_DIR / "camera_passport.jpg"
+    path = TEMP_UPLOAD_DIR / f"camera_{uuid.uuid4().hex[:8]}.jpg"
+    # Reject blurry/dark/glary frames and fix rotation before the slow OCR pass
+    quality = check_frame(camera_image.getvalue())
     with open(path, "wb") as f:
-        f.write(camera_image.read())
+        f.write(quality["data"])
 
-    mrz = read_mrz(str(path))
-    if mrz:
+    mrz = read_mrz(str(path)) if quality["ok"] else None
+    if not quality["ok"]:
+        st.error(f"❌ {quality['reason']}")
+    elif mrz:
         fields = mrz.to_dict()
         passport_number = fields["number"].strip()
 
@@ -92,51 +107,58 @@ if camera_image:
             scan_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             row = {
                 "Kafla Code": kafla_code,
+                "Zaireen ID": str(uuid.uuid4())[:8],
                 "Zaireen Name": full_name,
                 "Passport Number": passport_number,
                 "Nationality": fields["nationality"],
                 "Date of Birth": convert_mrz_date(fields["date_of_birth"]),
                 "Sex": fields["sex"],
+                "Expiry Date": convert_mrz_date(fields["expiration_date"]),
                 "Scan Time": scan_time
             }
-            df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
             z_dir = kafla_dir / passport_number
             z_dir.mkdir(parents=True, exist_ok=True)
-            shutil.copy(str(path), z_dir / "passport.jpg")
-            df.to_csv(CSV_FILE, index=False)
+            store_document(path.read_bytes(), z_dir / "passport.jpg")
+            data_store.insert_zaireen(row)
+            df = data_store.load_zaireen()
             st.success("✅ Passport added via camera!")
         else:
             st.warning("⚠️ Duplicate passport detected.")
     else:
         st.error("❌ Could not read MRZ from image.")
+    os.remove(path)
 
 # Process uploaded files
 if st.session_state.uploaded_files:
     st.info(f"🗂 {len(st.session_state.uploaded_files)} file(s) ready")
     if st.button("🔍 Scan Uploaded Files"):
         accepted, rejected = 0, []
+        new_rows, pending = [], set()
 
         for file_path in st.session_state.uploaded_files:
             mrz = read_mrz(file_path)
             if mrz:
                 fields = mrz.to_dict()
                 passport_number = fields["number"].strip()
-                if not ((df["Kafla Code"] == kafla_code) & (df["Passport Number"].str.lower() == passport_number.lower())).any():
+                if passport_number.lower() not in pending and not ((df["Kafla Code"] == kafla_code) & (df["Passport Number"].str.lower() == passport_number.lower())).any():
                     full_name = f"{fields['surname']} {fields['names'].replace('<', ' ')}".strip()
                     scan_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
                     row = {
                         "Kafla Code": kafla_code,
+                        "Zaireen ID": str(uuid.uuid4())[:8],
                         "Zaireen Name": full_name,
                         "Passport Number": passport_number,
                         "Nationality": fields["nationality"],
                         "Date of Birth": convert_mrz_date(fields["date_of_birth"]),
                         "Sex": fields["sex"],
+                        "Expiry Date": convert_mrz_date(fields["expiration_date"]),
                         "Scan Time": scan_time
                     }
-                    df = pd.concat([df, pd.DataFrame([row])], ignore_index=True)
+                    new_rows.append(row)
+                    pending.add(passport_number.lower())
                     z_dir = kafla_dir / passport_number
                     z_dir.mkdir(parents=True, exist_ok=True)
-                    shutil.copy(file_path, z_dir / "passport.jpg")
+                    store_document(Path(file_path).read_bytes(), z_dir / "passport.jpg")
                     accepted += 1
                 else:
                     rejected.append(f"{file_path} (Duplicate)")
@@ -145,43 +167,75 @@ if st.session_state.uploaded_files:
 
             os.remove(file_path)
 
-        df.to_csv(CSV_FILE, index=False)
+        # One write (and one change-feed batch) for the whole scan
+        if new_rows:
+            data_store.insert_zaireen(new_rows)
+            df = data_store.load_zaireen()
         st.session_state.uploaded_files.clear()
         st.success(f"✅ {accepted} added.")
         if rejected:
             st.warning("⚠️ Some files rejected:")
             st.code("\n".join(rejected))
 
+# Bulk visa upload: all of a Kafla's visas in one go, matched by passport
+st.markdown("### 🛂 Bulk Visa Upload")
+visa_files = st.file_uploader("Upload Iran/Iraq visa scans", accept_multiple_files=True,
+                              type=["jpg", "jpeg", "png"], key=f"visas_{kafla_code}")
+visa_choice = st.radio("Visa", ["Detect from MRZ / file name", "Iran", "Iraq"], horizontal=True, key="visa_country")
+if visa_files and st.button("🛂 Match and Save Visas"):
+    batch_dir = TEMP_UPLOAD_DIR / f"visas_{uuid.uuid4().hex[:8]}"
+    batch_dir.mkdir(parents=True)
+    paths = []
+    for file in visa_files:
+        path = batch_dir / file.name
+        path.write_bytes(file.getvalue())
+        paths.append(path)
+    country = None if visa_choice.startswith("Detect") else visa_choice.lower()
+    with st.spinner(f"Reading {len(paths)} visa(s)..."):
+        visa_report = visa_ingest.ingest(kafla_code, paths, country)
+    shutil.rmtree(batch_dir, ignore_errors=True)
+    df = data_store.load_zaireen()
+    saved = (visa_report["Status"] == "saved").sum()
+    st.success(f"✅ {saved} of {len(visa_report)} visa(s) saved.")
+    if saved < len(visa_report):
+        st.warning("⚠️ Some visas were not matched:")
+        st.dataframe(visa_report[visa_report["Status"] != "saved"], use_container_width=True, hide_index=True)
+
 # Display Zaireen list
 st.markdown("### 🧾 Zaireen List")
 filtered = df[df["Kafla Code"] == kafla_code]
 
+
+def store_visa(upload, passport_number, doc_type):
+    # The uploader keeps its file across reruns; normalise and store it once
+    if upload is None or upload.file_id in st.session_state.stored_visas:
+        return
+    # Also fills the Iran/Iraq Visa column, as the bulk upload does
+    visa_ingest.store_one(kafla_code, passport_number, doc_type, upload.read())
+    st.session_state.stored_visas.add(upload.file_id)
+
+
 if not filtered.empty:
     for idx, row in filtered.iterrows():
         with st.expander(f"{row['Zaireen Name']} - {row['Passport Number']}"):
             col1, col2, col3 = st.columns([3, 3, 1])
 
             with col1:
-                visa_iran = st.file_uploader("Iran Visa", key=f"iran_{idx}", label_visibility="collapsed")
-                if visa_iran:
-                    with open(kafla_dir / row["Passport Number"] / "iran.jpg", "wb") as f:
-                        f.write(visa_iran.read())
+                visa_iran = st.file_uploader("Iran Visa", key=f"iran_{row['Passport Number']}", label_visibility="collapsed")
+                store_visa(visa_iran, row["Passport Number"], "iran")
 
             with col2:
-                visa_iraq = st.file_uploader("Iraq Visa", key=f"iraq_{idx}", label_visibility="collapsed")
-                if visa_iraq:
-                    with open(kafla_dir / row["Passport Number"] / "iraq.jpg", "wb") as f:
-                        f.write(visa_iraq.read())
+                visa_iraq = st.file_uploader("Iraq Visa", key=f"iraq_{row['Passport Number']}", label_visibility="collapsed")
+                store_visa(visa_iraq, row["Passport Number"], "iraq")
 
             with col3:
-                if st.button("🗑️ Delete", key=f"del_{idx}"):
-                    shutil.rmtree(kafla_dir / row["Passport Number"], ignore_errors=True)
-                    df = df.drop(index=idx)
-                    df.to_csv(CSV_FILE, index=False)
+                if st.button("🗑️ Delete", key=f"del_{row['Passport Number']}"):
+                    data_store.delete_zaireen(kafla_code, row["Passport Number"])
+                    locking.remove_tree(kafla_dir / row["Passport Number"])
                     st.rerun()
 
     # Download CSV
-    st.download_button("⬇️ Download CSV", data=filtered.to_csv(index=False), file_name=f"{kafla_code}_zaireen.csv", mime="text/csv")
+    st.download_button("⬇️ Download CSV", data=display_frame(filtered).to_csv(index=False), file_name=f"{kafla_code}_zaireen.csv", mime="text/csv")
 
     # Generate PDF
     def generate_pdf():
@@ -189,14 +243,14 @@ if not filtered.empty:
         doc = SimpleDocTemplate(buf, pagesize=A4)
         styles = getSampleStyleSheet()
         elements = [
-            Paragraph("ZAIREEN LIST 2025", styles["Title"]),
+            Paragraph(f"ZAIREEN LIST {seasons.kafla_season(kafla_code)}", styles["Title"]),
             Spacer(1, 12),
             Paragraph(f"Kafla: {selected_kafla_name}", styles["Normal"]),
             Spacer(1, 12),
         ]
         table_data = [["Name", "Passport No", "Nationality", "DOB", "Sex"]]
         for _, r in filtered.iterrows():
-            table_data.append([r["Zaireen Name"], r["Passport Number"], r["Nationality"], r["Date of Birth"], r["Sex"]])
+            table_data.append([r["Zaireen Name"], r["Passport Number"], r["Nationality"], fmt_date(r["Date of Birth"]), r["Sex"]])
         t = Table(table_data)
         t.setStyle(TableStyle([
             ("GRID", (0, 0), (-1, -1), 0.5, colors.black),